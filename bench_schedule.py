@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+日程表作成のベンチマーク（合成データ・ローカルのみ）。
+
+    python bench_schedule.py                          # 1k / 10k / 50k / 200k 行
+    python bench_schedule.py --sizes 1000 20000 --trace-memory
+    python bench_schedule.py --sizes 10000 --schedule-rows 600   # 10ページ分の工程表
+
+一時フォルダに 工程表(Sheet1)・依頼現場名(Sheet3)・出力テンプレートを生成し、
+create_schedule の工程ごとの時間（とピークメモリ）を表示する。
+出力は元の総当たり処理をそのまま移した reference_schedule の結果と突き合わせ、
+食い違いがあれば終了コード 1 で終わる。
+"""
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import openpyxl
+from dateutil.relativedelta import relativedelta
+
+import schedule_logic
+from schedule_timing import PhaseTimer
+from schedule_history import read_output_rows
+
+DEFAULT_SIZES = (1000, 10000, 50000, 200000)
+SCHEDULE_ROWS = 60
+BENCH_DATE = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+
+# --- 合成データ ---
+def _make_keys(rnd, count):
+    keys = []
+    for _ in range(count):
+        if rnd.random() < 0.5:
+            keys.append(f"{rnd.choice('ABKT')}{rnd.randint(1, 999)}-{rnd.randint(1, 9)}")  # 岐阜
+        else:
+            keys.append(f"{rnd.randint(100, 9999)}-{rnd.randint(1, 9)}")  # 滋賀
+    return keys
+
+def _drawing(rnd):
+    return f"{rnd.choice(['$', '＄', '', ''])}Z{rnd.randint(1, 60)}"
+
+def generate_request_rows(rnd, size, keys, today):
+    """依頼現場名 Sheet3 の A〜G 列（見出し行を含む）。"""
+    rows = [("番号", "図面", "現場", "新図面", "品名", "台数", "日付")]
+    for n in range(size):
+        key = rnd.choice(keys)
+        if rnd.random() < 0.1:
+            key = key.replace("-", rnd.choice("－ー−"))
+        if rnd.random() < 0.05:
+            key = f" {key} "
+        row = [n + 1, _drawing(rnd), key, _drawing(rnd), f"品{rnd.randint(1, 40)}", rnd.randint(1, 20)]
+        if rnd.random() < 0.03 and len(rows) > 1:
+            row = list(rows[-1][:6])  # A〜F が同じ重複行
+        g = today + timedelta(days=rnd.randint(-250, 120))
+        p = rnd.random()
+        if p < 0.6:
+            g_val = g
+        elif p < 0.9:
+            g_val = g.strftime("%Y/%m/%d")
+        elif p < 0.95:
+            g_val = "未定"
+        else:
+            g_val = None
+        rows.append(tuple(row) + (g_val,))
+    return rows
+
+def generate_schedule_rows(rnd, request_rows, schedule_rows=SCHEDULE_ROWS):
+    """工程表 Sheet1 の A〜L 列（1〜2行目は見出し）。"""
+    rows = [(None,) * 12, (None, None, "現場", "図面", "品名", "台数", None, None, "現場", "図面", "品名", "台数")]
+    body = request_rows[1:]
+    for _ in range(schedule_rows):
+        row = [None] * 12
+        for base in (2, 8):
+            p = rnd.random()
+            if p < 0.1:
+                row[base + 3] = rnd.randint(1, 9)  # 滋賀規格（現場・品名なし）
+                continue
+            if p < 0.2:
+                continue
+            src = rnd.choice(body)
+            row[base] = str(src[2]).strip()
+            row[base + 1] = src[1] if rnd.random() < 0.7 else _drawing(rnd)
+            row[base + 2] = src[4] if rnd.random() < 0.7 else f"品{rnd.randint(1, 40)}"
+            row[base + 3] = rnd.choice([rnd.randint(1, 30), str(rnd.randint(1, 30)), "", "1,2"])
+        rows.append(tuple(row))
+    return rows
+
+def _write_xlsx(path, sheet_name, rows):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def generate_workspace(root, size, seed=0, schedule_rows=SCHEDULE_ROWS):
+    """root 以下にベンチ用の入力一式を作り、パスの dict を返す。"""
+    rnd = random.Random(seed + size)
+    keys = _make_keys(rnd, max(100, size // 20))
+    request_rows = generate_request_rows(rnd, size, keys, BENCH_DATE)
+    schedule_rows = generate_schedule_rows(rnd, request_rows, schedule_rows)
+
+    import_path = os.path.join(root, "工程表")
+    output_path = os.path.join(root, "日程表")
+    os.makedirs(import_path, exist_ok=True)
+    os.makedirs(output_path, exist_ok=True)
+
+    schedule_file = os.path.join(import_path, f"{BENCH_DATE.month}-{BENCH_DATE.day}.xlsx")
+    request_file = os.path.join(root, "依頼現場名 R1.xlsx")
+    template_file = os.path.join(output_path, "生産日程表★.xlsx")
+    _write_xlsx(schedule_file, "Sheet1", schedule_rows)
+    _write_xlsx(request_file, "Sheet3", request_rows)
+    wb = openpyxl.Workbook()
+    wb.active.append(["現場", "日付", "番号", "品名", "新図面", "図面", None, None, "台数"])
+    wb.save(template_file)
+
+    return dict(import_path=import_path, output_path=output_path, schedule_file=schedule_file,
+                request_file=request_file, template_file=template_file,
+                snapshot_dir=os.path.join(root, ".cache"))
+
+# --- 正解データ（元の総当たり処理） ---
+def reference_schedule(schedule_rows, request_rows, filter_type, target_date, today):
+    """
+    最適化前の create_schedule をそのまま移したもの（3〜62行目の固定範囲だけはシートの最後までに広げてある）。
+    - 戻り値: (出力行 [[A, B, C, D, E, F, I], ...], (岐阜新, 滋賀新, 岐阜旧, 滋賀旧, 滋賀規格, 合計))
+    """
+    def cell(rows, col, r):
+        idx = ord(col) - ord("A")
+        if r > len(rows) or idx >= len(rows[r - 1]):
+            return None
+        return rows[r - 1][idx]
+
+    last_row = len(schedule_rows)
+    start_date = today - relativedelta(months=5)
+    end_date = today + relativedelta(months=2)
+    written_rows = set()
+    out_rows = []
+    for col_c in ("C", "I"):
+        for r in range(3, last_row + 1):
+            key_val = cell(schedule_rows, col_c, r)
+            if key_val is None:
+                continue
+            key_val_str = schedule_logic.normalize_key(key_val)
+            for req_r in range(2, len(request_rows) + 1):
+                req_key = cell(request_rows, "C", req_r)
+                if req_key is None or schedule_logic.normalize_key(req_key) != key_val_str:
+                    continue
+                req_g = schedule_logic.parse_excel_date(cell(request_rows, "G", req_r))
+                if req_g is None or req_g < start_date or req_g > end_date:
+                    continue
+                val_d = str(cell(request_rows, "D", req_r) or "").strip()
+                if filter_type == "dollar" and not (val_d.startswith("$") or val_d.startswith("＄")):
+                    continue
+                row_key = tuple(cell(request_rows, col, req_r) for col in "ABCDEF")
+                if row_key in written_rows:
+                    continue
+                written_rows.add(row_key)
+                out_rows.append([str(cell(request_rows, "C", req_r) or "").strip(), target_date.strftime("%Y/%m/%d"),
+                                 row_key[0], row_key[4], row_key[3], row_key[1], row_key[5]])
+
+    for out in out_rows:
+        val_a = schedule_logic.normalize_key(out[0])
+        for key_col, d_col, e_col, val_col in (("C", "D", "E", "F"), ("I", "J", "K", "L")):
+            for r in range(3, last_row + 1):
+                if (schedule_logic.normalize_key(cell(schedule_rows, key_col, r)) == val_a
+                        and cell(schedule_rows, d_col, r) == out[5] and cell(schedule_rows, e_col, r) == out[3]):
+                    out[6] = cell(schedule_rows, val_col, r)
+                    break
+
+    totals = [0, 0, 0, 0, 0]  # 岐阜新, 滋賀新, 岐阜旧, 滋賀旧, 滋賀規格
+    for key_col, d_col, e_col, val_col in (("C", "D", "E", "F"), ("I", "J", "K", "L")):
+        for r in range(3, last_row + 1):
+            c = cell(schedule_rows, key_col, r)
+            d = cell(schedule_rows, d_col, r)
+            e = cell(schedule_rows, e_col, r)
+            f_val = schedule_logic.safe_int(cell(schedule_rows, val_col, r))
+            if (c is None or str(c).strip() == "") and (e is None or str(e).strip() == "") and f_val:
+                totals[4] += f_val
+                continue
+            is_new = isinstance(d, str) and (d.startswith("$") or d.startswith("＄"))
+            if re.match(r'[A-Za-z]', str(c or "").strip()[:1]):
+                totals[0 if is_new else 2] += f_val
+            else:
+                totals[1 if is_new else 3] += f_val
+    return out_rows, tuple(totals) + (sum(totals),)
+
+# --- 計測 ---
+def _measure(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def run_size(root, size, filter_type, trace_memory=False, seed=0, schedule_rows=SCHEDULE_ROWS):
+    """1サイズ分のベンチを実行し、(結果行のリスト, 正解と一致したか) を返す。"""
+    paths = generate_workspace(root, size, seed, schedule_rows)
+    common = dict(import_path=paths["import_path"], output_path=paths["output_path"],
+                  request_file=paths["request_file"], template_file=paths["template_file"],
+                  snapshot_dir=paths["snapshot_dir"], history_db=None)  # 合成データを履歴に残さない
+    lines = []
+
+    # 1回目: スナップショットなし（依頼現場名をExcelから解析）
+    cold = PhaseTimer(trace_memory=trace_memory)
+    result = schedule_logic.create_schedule(BENCH_DATE.year, BENCH_DATE.month, BENCH_DATE.day, filter_type,
+                                            timer=cold, **common)
+    for name, seconds, peak in cold.phases:
+        lines.append((size, f"cold:{name}", seconds, peak))
+    lines.append((size, "cold:total", cold.total(), None))
+
+    # 2回目: スナップショットあり（force で作り直す）
+    warm = PhaseTimer(trace_memory=trace_memory)
+    schedule_logic.create_schedule(BENCH_DATE.year, BENCH_DATE.month, BENCH_DATE.day, filter_type,
+                                   timer=warm, force=True, **common)
+    lines.append((size, "warm:total", warm.total(), None))
+
+    # 3回目: 入力が同じなのでマニフェストの結果を返すだけ
+    memo = PhaseTimer()
+    memo_result = schedule_logic.create_schedule(BENCH_DATE.year, BENCH_DATE.month, BENCH_DATE.day, filter_type,
+                                                 timer=memo, **common)
+    lines.append((size, "memo:total", memo.total(), None))
+
+    # 工程単体
+    schedule_rows, sec = _measure(lambda: schedule_logic.read_excel_sheet(paths["schedule_file"], "Sheet1"))
+    lines.append((size, "stage:read_excel_sheet(Sheet1)", sec, None))
+    schedule_blocks, sec = _measure(lambda: schedule_logic.extract_schedule_blocks(schedule_rows))
+    lines.append((size, "stage:extract_schedule_blocks", sec, None))
+    sheet3, sec = _measure(lambda: schedule_logic.read_excel_sheet(paths["request_file"], "Sheet3", max_col=7))
+    lines.append((size, "stage:read_excel_sheet(Sheet3)", sec, None))
+    request_rows, sec = _measure(lambda: schedule_logic.parse_request_rows(sheet3))
+    lines.append((size, "stage:parse_request_rows", sec, None))
+    _, sec = _measure(lambda: schedule_logic.load_request_rows(paths["request_file"], snapshot_dir=paths["snapshot_dir"]))
+    lines.append((size, "stage:load_request_rows(snapshot)", sec, None))
+    index, sec = _measure(lambda: schedule_logic.build_request_index(request_rows))
+    lines.append((size, "stage:build_request_index", sec, None))
+    today = datetime.today()
+    start_date = today - relativedelta(months=5)
+    end_date = today + relativedelta(months=2)
+    out_rows, sec = _measure(lambda: schedule_logic.join_schedule(schedule_blocks, index, filter_type, BENCH_DATE, start_date, end_date))
+    lines.append((size, "stage:join_schedule", sec, None))
+    _, sec = _measure(lambda: schedule_logic.apply_backfill(out_rows, schedule_blocks))
+    lines.append((size, "stage:apply_backfill", sec, None))
+    _, sec = _measure(lambda: schedule_logic.summarize_schedule(schedule_blocks))
+    lines.append((size, "stage:summarize_schedule", sec, None))
+
+    # 正解との突き合わせ
+    (expected_rows, expected_totals), sec = _measure(
+        lambda: reference_schedule(schedule_rows, sheet3, filter_type, BENCH_DATE, today))
+    lines.append((size, "reference(総当たり)", sec, None))
+    ok = (read_output_rows(result[0]) == expected_rows and tuple(result[1:]) == expected_totals
+          and memo_result == result)
+    return lines, ok, len(expected_rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日程表作成のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="依頼現場名の行数")
+    parser.add_argument("--filter", dest="filter_type", choices=("all", "dollar"), default="all")
+    parser.add_argument("--trace-memory", action="store_true", help="工程ごとのピークメモリも測る")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--schedule-rows", type=int, default=SCHEDULE_ROWS, help="工程表のデータ行数")
+    parser.add_argument("--workdir", help="生成データの置き場（省略時は一時フォルダを作って最後に消す）")
+    args = parser.parse_args(argv)
+
+    root = args.workdir or tempfile.mkdtemp(prefix="schedule_bench_")
+    all_ok = True
+    try:
+        for size in args.sizes:
+            size_root = os.path.join(root, str(size))
+            lines, ok, out_count = run_size(size_root, size, args.filter_type, args.trace_memory, args.seed,
+                                          args.schedule_rows)
+            for s, name, seconds, peak in lines:
+                mem = f"{peak / (1024 * 1024):8.1f}MB" if peak is not None else ""
+                print(f"{s:>8} {name:<36} {seconds:9.4f}s {mem}")
+            print(f"{size:>8} 出力 {out_count} 行  正解との一致: {'OK' if ok else 'NG'}")
+            print()
+            all_ok = all_ok and ok
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+    return 0 if all_ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+GUI の起動時間の計測。
+
+    python bench_startup.py                                   # python schedule_gui.py を5回起動
+    python bench_startup.py --exe dist\\日程表つくるちゃん.exe --runs 10
+    python bench_startup.py --exe dist\\日程表つくるちゃん.exe --runs 1   # 再起動直後に1回 = コールド起動
+
+起動するたびに、プロセス開始から次の節目までの秒数を表示する。
+    shown  ウィンドウが最初に描画された
+    ready  常駐サービスの確認と先読みの準備が終わった
+    share  参照先（工程表フォルダ）の確認が終わった
+1回目はディスクキャッシュが温まっていない（cold）、2回目以降は warm として中央値も出す。
+GUI は環境変数 SCHEDULE_STARTUP_LOG に節目を書き、SCHEDULE_STARTUP_EXIT があれば share / ready の後に自分で終了する。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+EVENTS = ("shown", "ready", "share")
+
+def launch_once(command, timeout):
+    """1回起動して {節目: プロセス開始からの秒数} を返す（タイムアウトした節目は入らない）。"""
+    fd, log_path = tempfile.mkstemp(prefix="schedule_startup_", suffix=".jsonl")
+    os.close(fd)
+    env = dict(os.environ, SCHEDULE_STARTUP_LOG=log_path, SCHEDULE_STARTUP_EXIT="1")
+    try:
+        start = time.time()
+        proc = subprocess.Popen(command, env=env)
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        times = {}
+        with open(log_path, encoding="utf-8") as fp:
+            for line in fp:
+                event = json.loads(line)
+                times.setdefault(event["event"], event["time"] - start)
+        return times
+    finally:
+        os.remove(log_path)
+
+def _fmt(seconds):
+    return f"{seconds:8.3f}s" if seconds is not None else "       -"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日程表作成アプリの起動時間を測る")
+    parser.add_argument("--exe", help="PyInstaller でビルドした exe（省略時は python schedule_gui.py）")
+    parser.add_argument("--runs", type=int, default=5, help="起動する回数")
+    parser.add_argument("--timeout", type=float, default=120, help="1回あたりの待ち時間の上限（秒）")
+    parser.add_argument("--pause", type=float, default=1, help="起動と起動の間隔（秒）")
+    args = parser.parse_args(argv)
+
+    if args.exe:
+        command = [args.exe]
+    else:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule_gui.py")]
+
+    print(f"{'run':>5} " + " ".join(f"{name:>9}" for name in EVENTS))
+    runs = []
+    for i in range(args.runs):
+        if i:
+            time.sleep(args.pause)
+        times = launch_once(command, args.timeout)
+        runs.append(times)
+        label = "cold" if i == 0 else f"warm{i}"
+        print(f"{label:>5} " + " ".join(_fmt(times.get(name)) for name in EVENTS))
+
+    warm = runs[1:]
+    if warm:
+        medians = []
+        for name in EVENTS:
+            values = [t[name] for t in warm if name in t]
+            medians.append(statistics.median(values) if values else None)
+        print(f"{'med':>5} " + " ".join(_fmt(v) for v in medians))
+    # どれかの回で画面が出なかったら失敗
+    return 0 if all("shown" in t for t in runs) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
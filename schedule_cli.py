@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+日程表のコマンドライン実行（タスクスケジューラ用）。PyQt は読み込まない。
+
+    python schedule_cli.py                       # 今日の日程表
+    python schedule_cli.py --date 2025-10-25 --filter dollar
+    python schedule_cli.py --from 2025-10-01 --to 2025-10-31
+    python schedule_cli.py --date 2025-10-25 --formats csv jsonl        # xlsx は作らず CSV と JSON Lines だけ
+    python schedule_cli.py --from 2025-10-01 --to 2025-10-31 --totals   # 工程表の集計だけ（日程表は作らない）
+
+結果は JSON で標準出力に書く。1日分の作成では前回作成時からの差分（changes）も付く。
+期間指定で工程表が無い日は skipped: true になり、失敗には数えない。
+終了コード: 0=成功, 1=失敗した日がある, 2=引数エラー
+"""
+import sys
+import json
+import argparse
+from datetime import date, datetime
+
+RESULT_KEYS = ("save_file", "gifu_new", "shiga_new", "gifu_old", "shiga_old", "shiga_spec", "total_sum")
+
+def parse_date_arg(text):
+    """argparse の type 用: YYYY-MM-DD を date にする（schedule_history でも使う）。"""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付は YYYY-MM-DD で指定してください: {text}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生産日程表を作成する")
+    parser.add_argument("--date", type=parse_date_arg, help="作成する日 (YYYY-MM-DD, 省略時は今日)")
+    parser.add_argument("--from", dest="start", type=parse_date_arg, help="期間の開始日 (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=parse_date_arg, help="期間の終了日 (YYYY-MM-DD)")
+    parser.add_argument("--filter", dest="filter_type", choices=("all", "dollar"), default="all",
+                        help="all=全件, dollar=新図面のみ")
+    parser.add_argument("--import-path", help="工程表フォルダ")
+    parser.add_argument("--output-path", help="保存先フォルダ")
+    parser.add_argument("--request-file", help="依頼現場名ファイル")
+    parser.add_argument("--template-file", help="出力テンプレート")
+    parser.add_argument("--workers", type=int, help="期間指定時の並列数")
+    parser.add_argument("--formats", nargs="+", choices=("xlsx", "csv", "jsonl", "columnar"), default=["xlsx"],
+                        help="出力形式（複数可。既定は xlsx のみ）")
+    parser.add_argument("--totals", action="store_true",
+                        help="日程表は作らず、工程表の岐阜/滋賀・新旧・規格の台数を日ごとと期間合計で出す")
+    return parser
+
+def _result_dict(day, result, error):
+    entry = {"date": day.isoformat(), "ok": error is None}
+    if result is not None:
+        entry.update(zip(RESULT_KEYS, result))
+    elif error is None:
+        entry["skipped"] = True  # 工程表が無い日（休日など）は失敗にしない
+    else:
+        entry["error"] = error
+    return entry
+
+def _totals_output(schedule_logic, start, end, import_path):
+    results = schedule_logic.summarize_schedules(start, end, import_path)
+    days = []
+    total = [0] * len(schedule_logic.SUMMARY_KEYS)
+    for day, schedule_file, summary, error in results:
+        entry = {"date": day.isoformat(), "ok": error is None, "schedule_file": schedule_file}
+        if summary is not None:
+            entry.update(zip(schedule_logic.SUMMARY_KEYS, summary))
+            total = [a + b for a, b in zip(total, summary)]
+        if error is not None:
+            entry["error"] = error
+        days.append(entry)
+    return {"days": days, "total": dict(zip(schedule_logic.SUMMARY_KEYS, total))}, days
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error("--from と --to は両方指定してください")
+    if args.start is not None and args.date is not None:
+        parser.error("--date と --from/--to は同時に指定できません")
+    if args.start is not None and args.start > args.end:
+        parser.error("--from は --to 以前の日付にしてください")
+
+    # 重いモジュールは引数チェックが済んでから読み込む
+    import schedule_logic
+
+    paths = dict(
+        import_path=args.import_path or schedule_logic.DEFAULT_IMPORT,
+        output_path=args.output_path or schedule_logic.DEFAULT_OUTPUT,
+        request_file=args.request_file or schedule_logic.REQUEST_FILE,
+        template_file=args.template_file or schedule_logic.SCHEDULE_TEMPLATE,
+    )
+
+    if args.totals:
+        start, end = (args.start, args.end) if args.start is not None else (args.date or date.today(),) * 2
+        try:
+            output, entries = _totals_output(schedule_logic, start, end, paths["import_path"])
+        except Exception as e:
+            entries = [{"date": start.isoformat(), "ok": False, "error": str(e)}]
+            output = entries[0]
+    elif args.start is not None:
+        try:
+            results = schedule_logic.create_schedules(
+                args.start, args.end, args.filter_type, max_workers=args.workers, formats=args.formats, **paths)
+        except Exception as e:
+            results = [(args.start, None, str(e))]
+        entries = [_result_dict(d, result, error) for d, result, error in results]
+        output = entries
+    else:
+        day = args.date or date.today()
+        report = {}
+        try:
+            result = schedule_logic.create_schedule(day.year, day.month, day.day, args.filter_type,
+                                                    formats=args.formats, report=report, **paths)
+            entries = [_result_dict(day, result, None)]
+            entries[0]["changes"] = report
+        except Exception as e:
+            entries = [_result_dict(day, None, str(e))]
+        output = entries[0]
+
+    json.dump(output, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write("\n")
+    return 0 if all(e["ok"] for e in entries) else 1
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import sys, os
+import sys, os, time, json
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QSpinBox, QRadioButton,
     QPushButton, QMessageBox, QButtonGroup, QHBoxLayout, QFrame,
@@ -7,9 +7,12 @@ from PyQt6.QtWidgets import (
     QProgressDialog
 )
 from PyQt6.QtGui import QPixmap, QFont
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from datetime import datetime
-from schedule_logic import create_schedule
+# openpyxl などを読み込む schedule_logic / schedule_prefetch は使うときに読み込む（起動を待たせない）
+from schedule_progress import ProgressToken, ScheduleCancelled
+from schedule_service import ScheduleServiceClient
+from schedule_index import get_schedule_index
 
 # --- UNC パス対応 ---
 DEFAULT_IMPORT = r"\\PC011\Users\yasumoku\Desktop\タカラ関係\工程表"
@@ -43,43 +46,178 @@ try:
 except AttributeError:
     pass
 
-# --- UNC パス対応ディレクトリチェック ---
-try:
-    os.listdir(DEFAULT_IMPORT)
-except Exception as e:
-    app = QApplication(sys.argv)
-    QMessageBox.critical(None, "ディレクトリ無効",
-        f"参照先ディレクトリが存在しないかアクセスできません:\n{DEFAULT_IMPORT}\n{e}")
-    sys.exit(0)
+# --- 起動時間の計測（bench_startup.py が環境変数で指定する） ---
+STARTUP_LOG = os.environ.get("SCHEDULE_STARTUP_LOG")
+STARTUP_EXIT = bool(os.environ.get("SCHEDULE_STARTUP_EXIT"))
+
+def startup_event(name):
+    """起動の節目（shown / share / ready）の時刻を STARTUP_LOG に1行ずつ追記する。"""
+    if not STARTUP_LOG:
+        return
+    try:
+        with open(STARTUP_LOG, "a", encoding="utf-8") as fp:
+            fp.write(json.dumps({"event": name, "time": time.time()}) + "\n")
+    except OSError:
+        pass
+
+# --- 進捗表示用の工程名 ---
+STAGE_LABELS = {
+    "list": "工程表を探しています",
+    "manifest": "前回の結果を確認しています",
+    "revision": "前回からの変更を調べています",
+    "read_schedule": "工程表を読み込んでいます",
+    "load_request": "依頼現場名を読み込んでいます",
+    "load_template": "テンプレートを読み込んでいます",
+    "join": "現場を照合しています",
+    "backfill": "台数を転記しています",
+    "aggregate": "集計しています",
+    "save": "保存しています",
+}
+
+def describe_changes(report):
+    """create_schedule の report を完了メッセージの詳細用の文にする。"""
+    if report.get("cached"):
+        return "前回から変更はありません（前回の結果を使いました）"
+    if not report.get("previous"):
+        return ""
+    lines = [f"前回（{os.path.basename(report['previous'])}）からの変更: "
+             f"追加 {len(report.get('added', ()))}行, 削除 {len(report.get('removed', ()))}行, "
+             f"台数変更 {len(report.get('changed', ()))}行"]
+    for row in report.get("added", ())[:10]:
+        lines.append(f"+ {row[0]} {row[3]} {row[4]} {row[5]} ×{row[6]}")
+    for row in report.get("removed", ())[:10]:
+        lines.append(f"- {row[0]} {row[3]} {row[4]} {row[5]} ×{row[6]}")
+    for old, new in report.get("changed", ())[:10]:
+        lines.append(f"* {new[0]} {new[3]} {new[4]} {new[5]} ×{old[6]}→{new[6]}")
+    return "\n".join(lines)
 
 # --- Worker ---
 class ScheduleWorker(QThread):
     # --- 変更: 7個対応 ---
     finished = pyqtSignal(str, int, int, int, int, int, int)
     error = pyqtSignal(str)
-
-    def __init__(self, year, month, day, filter_type, import_file, output_path):
+    # 工程ごとの所要時間（PhaseTimer.summary() の1行）。finished / error の前に送る
+    timings = pyqtSignal(str)
+    # 進捗（工程名, 済み件数, 全件数）と中止完了
+    progress = pyqtSignal(str, int, int)
+    cancelled = pyqtSignal()
+    # 前回作成時からの差分の説明（describe_changes）。finished の前に送る
+    changes = pyqtSignal(str)
+
+    def __init__(self, year, month, day, filter_type, import_file, output_path, prefetcher=None, client=None,
+                 schedule_file=None):
         super().__init__()
         self.year = year
         self.month = month
         self.day = day
         self.filter_type = filter_type
         self.import_file = import_file
+        self.schedule_file = schedule_file  # 選んだ工程表 (ファイル名, 更新日時, フルパス)
         self.output_path = output_path
+        self.prefetcher = prefetcher
+        self.client = client  # 常駐サービスのクライアント（起動していなければこのプロセスで実行）
+        self.job_id = None
+        self.token = ProgressToken(on_progress=self.progress.emit)
+
+    def cancel(self):
+        # GUIスレッドから呼ぶ。処理側は次の確認ポイントで止まる
+        self.token.cancel()
+        if self.job_id is not None:
+            self.client.cancel(self.job_id)
 
     def run(self):
+        if self.client is not None and self.client.available():
+            self.run_remote()
+        else:
+            self.run_local()
+
+    def run_remote(self):
+        # 常駐サービスにジョブを渡し、終わるまで進捗を取りに行く
         try:
+            schedule_file = self.schedule_file[2] if self.schedule_file else None
+            self.job_id = self.client.submit(self.year, self.month, self.day, self.filter_type, schedule_file)
+            if self.token.cancelled:
+                self.client.cancel(self.job_id)
+            while True:
+                job = self.client.status(self.job_id)
+                if job["status"] in ("finished", "error", "cancelled"):
+                    break
+                if job["stage"]:
+                    self.progress.emit(job["stage"], job["done"], job["total"])
+                time.sleep(0.2)
+        except Exception as e:
+            self.error.emit(f"常駐サービスとの通信に失敗しました:\n{e}")
+            return
+        self.timings.emit(job["timings"] or "")
+        if job["status"] == "finished":
+            self.changes.emit(describe_changes(job.get("changes") or {}))
+            r = job["result"]
+            self.finished.emit(r["save_file"], r["gifu_new"], r["shiga_new"], r["gifu_old"],
+                               r["shiga_old"], r["shiga_spec"], r["total_sum"])
+        elif job["status"] == "cancelled":
+            self.cancelled.emit()
+        else:
+            self.error.emit(job["error"])
+
+    def run_local(self):
+        from schedule_logic import create_schedule
+        from schedule_timing import PhaseTimer
+        timer = PhaseTimer()
+        try:
+            # 先読み済みの入力を使う（変わっていれば読み直される）
+            inputs = self.prefetcher.inputs() if self.prefetcher is not None else {}
+            if self.schedule_file:
+                inputs["schedule_files"] = [self.schedule_file]
+            report = {}
             # --- 変更: create_schedule 7個戻り値対応 ---
             save_file, gifu_new, shiga_new, gifu_old, shiga_old, shiga_spec, total_sum = create_schedule(
                 self.year, self.month, self.day,
                 self.filter_type,
                 self.import_file,
-                self.output_path
+                self.output_path,
+                timer=timer,
+                token=self.token,
+                report=report,
+                **inputs
             )
+            self.timings.emit(timer.summary())
+            self.changes.emit(describe_changes(report))
             self.finished.emit(save_file, gifu_new, shiga_new, gifu_old, shiga_old, shiga_spec, total_sum)
+        except ScheduleCancelled:
+            self.timings.emit(timer.summary())
+            self.cancelled.emit()
         except Exception as e:
+            self.timings.emit(timer.summary())
             self.error.emit(str(e))
 
+# --- 起動直後の確認と準備（画面を出してからバックグラウンドで行う） ---
+class StartupWorker(QThread):
+    # 参照先に届くか, エラー内容
+    share_checked = pyqtSignal(bool, str)
+    # 先読みを始めた SchedulePrefetcher（常駐サービスに任せるときは None）
+    prepared = pyqtSignal(object)
+
+    def __init__(self, import_path, service_client):
+        super().__init__()
+        self.import_path = import_path
+        self.service_client = service_client
+
+    def run(self):
+        if self.service_client.available():
+            self.prepared.emit(None)
+        else:
+            # 重いモジュールはここで読み込む
+            from schedule_prefetch import SchedulePrefetcher
+            prefetcher = SchedulePrefetcher(self.import_path)
+            prefetcher.start()
+            self.prepared.emit(prefetcher)
+        # 参照先の確認を兼ねて工程表の索引を作っておく（PC011 が寝ていると時間がかかる）
+        try:
+            get_schedule_index(self.import_path).refresh()
+            self.share_checked.emit(True, "")
+        except Exception as e:
+            self.share_checked.emit(False, str(e))
+
 # --- ファイル選択ダイアログ ---
 class FileSelectDialog(QDialog):
     def __init__(self, files):
@@ -218,6 +356,10 @@ class CuteScheduleApp(QWidget):
         self.import_label = QLabel(f"参照先: {DEFAULT_IMPORT}")
         self.import_label.setFont(QFont("Arial", 12))
         import_layout.addWidget(self.import_label)
+        self.share_status = QLabel()
+        self.share_status.setFont(QFont("Arial", 11))
+        self.set_share_status("#9e9e9e", "接続を確認しています...")
+        import_layout.addWidget(self.share_status)
         import_frame.setLayout(import_layout)
         layout.addWidget(import_frame)
 
@@ -242,42 +384,79 @@ class CuteScheduleApp(QWidget):
 
         self.setLayout(layout)
         self.progress_dialog = None
+        self.last_timings = ""
+        self.last_changes = ""
+
+        # 常駐サービスが動いていればそちらに任せる。いなければ日付を選んでいる間に共有ファイルを先読みしておく
+        # （確認・先読みの準備・参照先の確認はバックグラウンドで行い、終わるまでは先読みなしで実行できる）
+        self.service_client = ScheduleServiceClient()
+        self.prefetcher = None
+        self._startup_pending = {"share", "ready"}
+        self.startup_worker = StartupWorker(DEFAULT_IMPORT, self.service_client)
+        self.startup_worker.share_checked.connect(self.on_share_checked)
+        self.startup_worker.prepared.connect(self.on_prepared)
+        self.startup_worker.start()
+
+    def set_share_status(self, color, text):
+        self.share_status.setText(f"<span style='color:{color}'>●</span> {text}")
+
+    def on_share_checked(self, ok, err):
+        if ok:
+            self.set_share_status("#43a047", "接続できます")
+            self.share_status.setToolTip("")
+        else:
+            self.set_share_status("#e53935", "参照先にアクセスできません")
+            self.share_status.setToolTip(err)
+        self.on_startup_step("share")
+
+    def on_prepared(self, prefetcher):
+        self.prefetcher = prefetcher
+        self.on_startup_step("ready")
+
+    def on_startup_step(self, name):
+        startup_event(name)
+        self._startup_pending.discard(name)
+        if STARTUP_EXIT and not self._startup_pending:
+            QApplication.quit()
+
+    def closeEvent(self, event):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        super().closeEvent(event)
 
     # --- 実行処理 ---
     def on_run(self):
         year, month, day = self.year_input.value(), self.month_input.value(), self.day_input.value()
         filter_type = "all" if self.rb_all.isChecked() else "dollar"
 
-        # ファイル一覧取得（UNC対応）
-        files = []
+        # 工程表の候補（フォルダの索引から引く。処理側も同じ索引を使う）
         try:
-            for f in os.listdir(DEFAULT_IMPORT):
-                fullpath = os.path.normpath(os.path.join(DEFAULT_IMPORT, f))
-                if os.path.isfile(fullpath) and f.lower().endswith(".xls"):
-                    if f.startswith(f"{month}-{day}"):
-                        mtime = datetime.fromtimestamp(os.path.getmtime(fullpath)).strftime("%Y-%m-%d %H:%M")
-                        files.append((f, mtime))
+            candidates = get_schedule_index(DEFAULT_IMPORT).candidates(month, day)
         except Exception as e:
             QMessageBox.critical(self, "参照エラー", f"参照先ディレクトリを読み込めません:\n{DEFAULT_IMPORT}\n{e}")
             return
 
-        if len(files) > 1:
+        if len(candidates) > 1:
+            files = [(name, mtime.strftime("%Y-%m-%d %H:%M")) for name, mtime, _ in candidates]
             dlg = FileSelectDialog(files)
             if dlg.exec() == QDialog.DialogCode.Accepted:
-                selected_file = dlg.get_selected_file()
+                selected_name = dlg.get_selected_file()
+                if selected_name is None:
+                    return
+                selected_file = next(c for c in candidates if c[0] == selected_name)
             else:
                 return
-        elif files:
-            selected_file = files[0][0]
+        elif candidates:
+            selected_file = candidates[0]
         else:
             selected_file = None
 
         # 進捗バー
-        self.progress_dialog = QProgressDialog("処理中です...", None, 0, 0, self)
+        self.progress_dialog = QProgressDialog("処理中です...", "中止", 0, 0, self)
         self.progress_dialog.setWindowTitle("実行中")
         self.progress_dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
-        self.progress_dialog.setCancelButton(None)
         self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
         self.progress_dialog.setMinimumWidth(300)
         self.progress_dialog.setMinimumHeight(80)
         geo = self.frameGeometry()
@@ -285,33 +464,84 @@ class CuteScheduleApp(QWidget):
         self.progress_dialog.move(center_point - self.progress_dialog.rect().center())
         self.progress_dialog.show()
 
-        self.worker = ScheduleWorker(year, month, day, filter_type, DEFAULT_IMPORT, DEFAULT_OUTPUT)
+        self.worker = ScheduleWorker(year, month, day, filter_type, DEFAULT_IMPORT, DEFAULT_OUTPUT,
+                                     self.prefetcher, self.service_client, selected_file)
+        self.worker.timings.connect(self.on_timings)
+        self.worker.changes.connect(self.on_changes)
+        self.worker.progress.connect(self.on_progress)
         self.worker.finished.connect(self.on_finished)
         self.worker.error.connect(self.on_error)
+        self.worker.cancelled.connect(self.on_cancelled)
+        self.progress_dialog.canceled.connect(self.on_cancel_clicked)
         self.worker.start()
 
+    def on_progress(self, stage, done, total):
+        if not self.progress_dialog or self.progress_dialog.wasCanceled():
+            return
+        label = STAGE_LABELS.get(stage, "処理中です")
+        if total:
+            self.progress_dialog.setRange(0, total)
+            self.progress_dialog.setValue(min(done, total))
+            self.progress_dialog.setLabelText(f"{label}... ({done}/{total})")
+        else:
+            self.progress_dialog.setRange(0, 0)
+            self.progress_dialog.setLabelText(f"{label}...")
+
+    def close_progress_dialog(self):
+        # close() でも canceled が送られるので、先に切り離して on_cancel_clicked が呼ばれないようにする
+        dialog, self.progress_dialog = self.progress_dialog, None
+        if dialog:
+            dialog.canceled.disconnect(self.on_cancel_clicked)
+            dialog.close()
+
+    def on_cancel_clicked(self):
+        if self.progress_dialog:
+            # 中止が終わるまでダイアログは閉じない（Excel と一時ファイルの後始末を待つ）
+            self.progress_dialog.show()
+            self.progress_dialog.setRange(0, 0)
+            self.progress_dialog.setLabelText("中止しています...")
+            self.progress_dialog.setCancelButton(None)
+        self.worker.cancel()
+
+    def on_cancelled(self):
+        self.close_progress_dialog()
+        QMessageBox.information(self, "中止", "処理を中止しました。")
+
     # --- 変更: 7個対応、滋賀規格表示追加 ---
     def on_finished(self, save_file, gifu_new, shiga_new, gifu_old, shiga_old, shiga_spec, total_sum):
-        if self.progress_dialog:
-            self.progress_dialog.close()
-            self.progress_dialog = None
-        QMessageBox.information(
-            self, "完了",
+        self.close_progress_dialog()
+        box = QMessageBox(
+            QMessageBox.Icon.Information, "完了",
             f"保存完了: {save_file}\n"
             f"岐阜新: {gifu_new}, 滋賀新: {shiga_new},\n"
             f"岐阜旧: {gifu_old}, 滋賀旧: {shiga_old},\n"
             f"滋賀規格: {shiga_spec}\n"
-            f"Totalは {total_sum}台です"
+            f"Totalは {total_sum}台です",
+            QMessageBox.StandardButton.Ok, self
         )
+        details = []
+        if self.last_changes:
+            details.append(self.last_changes)
+        if self.last_timings:
+            details.append("処理時間:\n" + self.last_timings.replace(" ", "\n"))
+        if details:
+            box.setDetailedText("\n\n".join(details))
+        box.exec()
+
+    def on_timings(self, summary):
+        self.last_timings = summary
+
+    def on_changes(self, text):
+        self.last_changes = text
 
     def on_error(self, msg):
-        if self.progress_dialog:
-            self.progress_dialog.close()
-            self.progress_dialog = None
+        self.close_progress_dialog()
         QMessageBox.critical(self, "エラー", msg)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     win = CuteScheduleApp()
     win.show()
+    # 最初の描画が終わってから呼ばれる
+    QTimer.singleShot(0, lambda: startup_event("shown"))
     sys.exit(app.exec())
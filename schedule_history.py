@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+作成した日程表の履歴（出力行と集計）をローカルの SQLite に貯めて、日付や現場キーで引けるようにする。
+
+    python schedule_history.py totals --from 2025-09-01 --to 2025-09-30   # 期間の合計と日ごとの集計
+    python schedule_history.py site K61-7 --from 2025-09-01              # 現場キーの日ごとの件数・台数
+    python schedule_history.py lookup K61-7 --date 2025-09-12            # 現場キーの出力行
+    python schedule_history.py backfill                                  # 保存先フォルダの過去の日程表を取り込む
+
+- create_schedule は作成のたびに record_run で記録する（history_db=None で無効）
+- 集計（岐阜新〜合計）は (日付, 保存先フォルダ) ごとに1件、出力行は (日付, フィルター, 保存先フォルダ) ごとに
+  最新の1回分だけ持つ。問い合わせは保存先フォルダごと（省略時は日程表の保存先）なので、
+  --output-path を変えた試しの作成が本番の集計に混ざらない
+- 結果は JSON で標準出力に書く
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import date, datetime
+
+from schedule_timing import LOG_DIR
+from schedule_cli import parse_date_arg
+
+HISTORY_DB = os.path.join(LOG_DIR, "history.sqlite3")
+HISTORY_VERSION = 2
+
+# create_schedule の戻り値の集計部分（schedule_logic.SUMMARY_KEYS と同じ順）
+TOTAL_KEYS = ("gifu_new", "shiga_new", "gifu_old", "shiga_old", "shiga_spec", "total_sum")
+ROW_KEYS = ("A", "B", "C", "D", "E", "F", "I")
+
+# 保存先フォルダの日程表（YYYYMMDD_生産日程表★.xlsx）
+OUTPUT_NAME = re.compile(r"^(\d{4})(\d{2})(\d{2})_生産日程表★\.xlsx$")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS totals (
+    date TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    schedule_file TEXT,
+    {", ".join(f"{key} INTEGER NOT NULL" for key in TOTAL_KEYS)},
+    recorded TEXT NOT NULL,
+    PRIMARY KEY (output_path, date)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    filter_type TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    save_file TEXT,
+    file_mtime REAL,
+    source TEXT NOT NULL,
+    recorded TEXT NOT NULL,
+    UNIQUE (output_path, date, filter_type)
+);
+CREATE TABLE IF NOT EXISTS output_rows (
+    output_id INTEGER NOT NULL REFERENCES outputs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    site_key TEXT NOT NULL,
+    {", ".join(ROW_KEYS)}
+);
+CREATE INDEX IF NOT EXISTS output_rows_site ON output_rows (site_key);
+CREATE INDEX IF NOT EXISTS output_rows_output ON output_rows (output_id, seq);
+CREATE INDEX IF NOT EXISTS outputs_save_file ON outputs (save_file);
+"""
+
+def _db_value(v):
+    # SQLite に入らない型（日時）は文字列にする
+    if isinstance(v, (datetime, date)):
+        return v.isoformat(sep=" ") if isinstance(v, datetime) else v.isoformat()
+    return v
+
+def _site_key(val):
+    from schedule_logic import normalize_key
+    return normalize_key(val)
+
+def _iso(d):
+    return d.isoformat() if isinstance(d, (date, datetime)) else d
+
+def _folder(output_path):
+    # 同じフォルダを同じ文字列にする（None は日程表の保存先）
+    if output_path is None:
+        from schedule_logic import DEFAULT_OUTPUT
+        output_path = DEFAULT_OUTPUT
+    return os.path.normcase(os.path.abspath(os.path.normpath(output_path.rstrip("\\"))))
+
+class ScheduleHistory:
+    """
+    - record(): 1回分の作成結果（出力行・集計）を記録する
+    - totals(start, end) / daily_totals(start, end): 期間の合計・日ごとの集計
+    - site_history(key) / lookup(key): 現場キーの日ごとの件数・台数 / 出力行
+    - backfill(output_path): 保存先フォルダの過去の日程表を取り込む
+    """
+    def __init__(self, path=None, timeout=30):
+        self.path = path or HISTORY_DB
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=timeout)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if self._version() != HISTORY_VERSION:
+            # 複数プロセス（期間まとめて作成）から同時に書くので WAL にする
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self._create_schema()
+
+    def _version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _create_schema(self):
+        # 同時に開いた他のプロセスが先に作っていれば何もしない（書き込みロックを取ってから版を確かめる）
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._version() != HISTORY_VERSION:
+                # 古い形式（保存先フォルダの区別なし）は作り直す。過去分は backfill で取り込み直せる
+                for table in ("output_rows", "outputs", "totals"):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in _SCHEMA.split(";"):
+                    if statement.strip():
+                        self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {HISTORY_VERSION}")
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 記録 ---
+    def record(self, day, filter_type, out_rows, totals=None, save_file=None, schedule_file=None, source="run"):
+        """
+        - day: 日程表の日付
+        - out_rows: 出力行（[A, B, C, D, E, F, I]）。同じ日付・フィルター・保存先フォルダの前回分は置き換える
+        - totals: (岐阜新, 滋賀新, 岐阜旧, 滋賀旧, 滋賀規格, 合計)。None なら集計は更新しない
+        - save_file: 保存したファイル。そのフォルダを保存先フォルダとして記録する
+        """
+        day = _iso(day)
+        folder = _folder(os.path.dirname(save_file)) if save_file else ""
+        now = datetime.now().isoformat(sep=" ", timespec="seconds")
+        file_mtime = None
+        if save_file:
+            try:
+                file_mtime = os.stat(save_file).st_mtime
+            except OSError:
+                pass
+        with self.conn:
+            if totals is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO totals (date, output_path, schedule_file, "
+                    f"{', '.join(TOTAL_KEYS)}, recorded) VALUES (?, ?, ?, {', '.join('?' * len(TOTAL_KEYS))}, ?)",
+                    (day, folder, schedule_file, *(int(v) for v in totals), now))
+            self.conn.execute("DELETE FROM outputs WHERE output_path = ? AND date = ? AND filter_type = ?",
+                              (folder, day, filter_type))
+            output_id = self.conn.execute(
+                "INSERT INTO outputs (date, filter_type, output_path, save_file, file_mtime, source, recorded) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (day, filter_type, folder, save_file, file_mtime, source, now)).lastrowid
+            self.conn.executemany(
+                f"INSERT INTO output_rows (output_id, seq, site_key, {', '.join(ROW_KEYS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(ROW_KEYS))})",
+                ((output_id, seq, _site_key(out[0]), *(_db_value(v) for v in out))
+                 for seq, out in enumerate(out_rows)))
+
+    # --- 問い合わせ（output_path: 保存先フォルダ。省略時は日程表の保存先） ---
+    def daily_totals(self, start, end, output_path=None):
+        """start〜end（両端を含む）の記録がある日の集計 [{date, schedule_file, gifu_new, ...}, ...]。"""
+        rows = self.conn.execute(
+            f"SELECT date, schedule_file, {', '.join(TOTAL_KEYS)} FROM totals "
+            "WHERE output_path = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (_folder(output_path), _iso(start), _iso(end)))
+        return [dict(row) for row in rows]
+
+    def totals(self, start, end, output_path=None):
+        """start〜end の集計の合計 {days, gifu_new, ..., total_sum}（days は記録がある日数）。"""
+        row = self.conn.execute(
+            f"SELECT COUNT(*) AS days, {', '.join(f'COALESCE(SUM({key}), 0) AS {key}' for key in TOTAL_KEYS)} "
+            "FROM totals WHERE output_path = ? AND date BETWEEN ? AND ?",
+            (_folder(output_path), _iso(start), _iso(end))).fetchone()
+        return dict(row)
+
+    def site_history(self, site_key, start=None, end=None, filter_type=None, output_path=None):
+        """現場キーが出てきた日ごとの行数と台数の合計 [{date, filter_type, rows, qty}, ...]。"""
+        sql = ("SELECT o.date, o.filter_type, COUNT(*) AS rows, SUM(r.I) AS qty "
+               "FROM output_rows r JOIN outputs o ON o.id = r.output_id WHERE r.site_key = ?")
+        sql, params = self._filters(sql, [_site_key(site_key)], start, end, filter_type, output_path)
+        rows = self.conn.execute(sql + " GROUP BY o.id ORDER BY o.date, o.filter_type", params)
+        return [dict(row) for row in rows]
+
+    def lookup(self, site_key, day=None, filter_type=None, output_path=None):
+        """現場キーの出力行 [{date, filter_type, A, ..., I}, ...]。day を指定するとその日だけ。"""
+        sql = (f"SELECT o.date, o.filter_type, {', '.join(f'r.{key}' for key in ROW_KEYS)} "
+               "FROM output_rows r JOIN outputs o ON o.id = r.output_id WHERE r.site_key = ?")
+        sql, params = self._filters(sql, [_site_key(site_key)], day, day, filter_type, output_path)
+        rows = self.conn.execute(sql + " ORDER BY o.date, o.filter_type, r.seq", params)
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _filters(sql, params, start, end, filter_type, output_path):
+        sql += " AND o.output_path = ?"
+        params.append(_folder(output_path))
+        if start is not None:
+            sql += " AND o.date >= ?"
+            params.append(_iso(start))
+        if end is not None:
+            sql += " AND o.date <= ?"
+            params.append(_iso(end))
+        if filter_type is not None:
+            sql += " AND o.filter_type = ?"
+            params.append(filter_type)
+        return sql, params
+
+    # --- 過去分の取り込み ---
+    def backfill(self, output_path, import_path=None, force=False):
+        """
+        保存先フォルダの YYYYMMDD_生産日程表★.xlsx を取り込み、{"imported", "skipped", "errors"} を返す。
+        - 前回取り込んだときから更新日時が変わっていないファイルは読まない（force=True なら全部読む）
+        - 集計は隣のマニフェストから取る。無ければ import_path の工程表から集計する（どちらも無ければ集計なし）
+        - フィルターはファイル名に無いので、全行の図面が新図面（$ / ＄）なら dollar、それ以外は all とみなす
+        """
+        import schedule_logic
+
+        index = schedule_logic.get_schedule_index(import_path) if import_path else None
+        imported, skipped, errors = [], [], []
+        with os.scandir(output_path) as it:
+            entries = sorted((entry for entry in it if OUTPUT_NAME.match(entry.name)), key=lambda e: e.name)
+        for entry in entries:
+            save_file = os.path.normpath(entry.path)
+            if not force and self._recorded_mtime(save_file) == entry.stat().st_mtime:
+                skipped.append(save_file)
+                continue
+            try:
+                y, m, d = (int(g) for g in OUTPUT_NAME.match(entry.name).groups())
+                day = date(y, m, d)
+                out_rows = read_output_rows(save_file)
+                totals, schedule_file = self._backfill_totals(schedule_logic, save_file, index, day)
+                drawings = [str(out[4] or "").strip() for out in out_rows]
+                dollar = bool(drawings) and all(d.startswith(("$", "＄")) for d in drawings)
+                self.record(day, "dollar" if dollar else "all", out_rows, totals, save_file, schedule_file,
+                            source="backfill")
+                imported.append(save_file)
+            except Exception as e:
+                errors.append({"file": save_file, "error": str(e)})
+        return {"imported": imported, "skipped": skipped, "errors": errors}
+
+    def _recorded_mtime(self, save_file):
+        row = self.conn.execute("SELECT file_mtime FROM outputs WHERE save_file = ? ORDER BY recorded DESC LIMIT 1",
+                                (save_file,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _backfill_totals(schedule_logic, save_file, index, day):
+        try:
+            manifest = json.loads(schedule_logic.read_file_bytes(schedule_logic._manifest_path(save_file)))
+            return [int(v) for v in manifest["result"]], None
+        except (OSError, ValueError, KeyError):
+            pass
+        if index is None:
+            return None, None
+        candidates = schedule_logic.find_schedule_candidates(index, day.month, day.day)
+        if not candidates:
+            return None, None
+        schedule_file = candidates[0][2]
+        rows = schedule_logic.read_excel_sheet(schedule_file, "Sheet1")
+        return schedule_logic.summarize_schedule(schedule_logic.extract_schedule_blocks(rows)), schedule_file
+
+def read_output_rows(save_file):
+    """日程表（xlsx）の2行目以降から [A, B, C, D, E, F, I] を読む（空行は飛ばす）。"""
+    import openpyxl
+    wb = openpyxl.load_workbook(save_file, read_only=True, data_only=True)
+    try:
+        out_rows = []
+        for values in wb.active.iter_rows(min_row=2, max_col=9, values_only=True):
+            values = tuple(values) + (None,) * (9 - len(values))
+            out = list(values[:6]) + [values[8]]
+            if all(v is None or v == "" for v in out):
+                continue
+            out_rows.append(out)
+        return out_rows
+    finally:
+        wb.close()
+
+def record_run(history_db, day, filter_type, out_rows, totals, save_file=None, schedule_file=None):
+    """create_schedule から呼ぶ。記録できなくても作成は失敗にしない。"""
+    try:
+        with ScheduleHistory(history_db) as history:
+            history.record(day, filter_type, out_rows, totals, save_file, schedule_file)
+    except (sqlite3.Error, OSError):
+        pass
+
+# --- コマンドライン ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="作成した日程表の履歴を引く")
+    parser.add_argument("--history-db", help="履歴データベース（省略時は LOCALAPPDATA\\schedule\\history.sqlite3）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("totals", help="期間の合計と日ごとの集計")
+    p.add_argument("--from", dest="start", type=parse_date_arg, required=True)
+    p.add_argument("--to", dest="end", type=parse_date_arg, required=True)
+    p.add_argument("--output-path", help="保存先フォルダ（省略時は日程表の保存先）")
+
+    for name, help_text in (("site", "現場キーの日ごとの件数・台数"), ("lookup", "現場キーの出力行")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("site_key")
+        p.add_argument("--filter", dest="filter_type", choices=("all", "dollar"))
+        p.add_argument("--output-path", help="保存先フォルダ（省略時は日程表の保存先）")
+        if name == "site":
+            p.add_argument("--from", dest="start", type=parse_date_arg)
+            p.add_argument("--to", dest="end", type=parse_date_arg)
+        else:
+            p.add_argument("--date", type=parse_date_arg)
+
+    p = sub.add_parser("backfill", help="保存先フォルダの過去の日程表を取り込む")
+    p.add_argument("--output-path", help="保存先フォルダ（省略時は日程表の保存先）")
+    p.add_argument("--import-path", help="マニフェストが無い日の集計に使う工程表フォルダ")
+    p.add_argument("--force", action="store_true", help="取り込み済みで変わっていないファイルも読み直す")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with ScheduleHistory(args.history_db) as history:
+        if args.command == "totals":
+            output = {"total": history.totals(args.start, args.end, args.output_path),
+                      "days": history.daily_totals(args.start, args.end, args.output_path)}
+        elif args.command == "site":
+            output = history.site_history(args.site_key, args.start, args.end, args.filter_type, args.output_path)
+        elif args.command == "lookup":
+            output = history.lookup(args.site_key, args.date, args.filter_type, args.output_path)
+        else:
+            import schedule_logic
+            output = history.backfill(args.output_path or schedule_logic.DEFAULT_OUTPUT, args.import_path,
+                                      force=args.force)
+    json.dump(output, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write("\n")
+    return 1 if isinstance(output, dict) and output.get("errors") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
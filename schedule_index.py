@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+工程表フォルダの索引。GUI のファイル選択と create_schedule の両方がここから候補を引く。
+
+- フォルダは scandir 1回で読み、ファイルごとの stat はしない（Windows では一覧に更新日時が含まれる）
+- ファイル名の「月-日」ごとにまとめておくので、候補は (月, 日) で直接引ける
+- 再読み込みはフォルダの更新日時が変わったとき（と max_age 秒ごと）だけ。変わっていないファイルは解析し直さない
+"""
+import os
+import re
+import time
+import threading
+from datetime import date, datetime
+
+# ファイル名中の「月-日」（10-25.xls, 工程表10-25修正.xlsx など）
+DATE_IN_NAME = re.compile(r"(?<!\d)(\d{1,2})-(\d{1,2})(?!\d)")
+
+SCHEDULE_EXTENSIONS = (".xls", ".xlsx")
+
+def dates_in_name(name):
+    """ファイル名に含まれる (月, 日) の組をすべて返す（日付として成り立たないものは除く）。"""
+    found = []
+    for m in DATE_IN_NAME.finditer(name):
+        month, day = int(m.group(1)), int(m.group(2))
+        if 1 <= month <= 12 and 1 <= day <= 31 and (month, day) not in found:
+            found.append((month, day))
+    return found
+
+def date_from_name(name, today=None):
+    """
+    ファイル名の「月-日」から日付を決める。年は today に一番近くなるように選ぶ
+    （12月に置かれた 1-5.xls は翌年、1月に置かれた 12-28.xls は前年）。
+    """
+    m = DATE_IN_NAME.search(name)
+    if not m:
+        return None
+    month, day = int(m.group(1)), int(m.group(2))
+    today = today or date.today()
+    best = None
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            d = date(year, month, day)
+        except ValueError:
+            continue
+        if best is None or abs((d - today).days) < abs((best - today).days):
+            best = d
+    return best
+
+def is_schedule_file(name):
+    # Excel の一時ファイル（~$10-25.xls）は除く
+    return not name.startswith("~$") and name.lower().endswith(SCHEDULE_EXTENSIONS)
+
+def scan_schedule_folder(import_path):
+    """工程表フォルダを1回だけ走査し、(ファイル名, 更新日時, フルパス) のリストを返す。"""
+    files = []
+    with os.scandir(import_path) as it:
+        for entry in it:
+            if is_schedule_file(entry.name):
+                update_time = datetime.fromtimestamp(entry.stat().st_mtime)
+                files.append((entry.name, update_time, os.path.normpath(entry.path)))
+    return files
+
+class ScheduleIndex:
+    """
+    - candidates(month, day): その日の工程表 [(ファイル名, 更新日時, フルパス), ...]（ファイル名順）
+    - files(): 全工程表（list_schedule_files と同じ形）
+    - refresh(): 変わっていれば読み直す。candidates / files は呼ぶたびに refresh する
+    """
+    def __init__(self, import_path, max_age=60):
+        self.import_path = os.path.normpath(import_path.rstrip("\\"))
+        self.max_age = max_age  # 上書き保存ではフォルダの更新日時が変わらないので、この秒数ごとに読み直す
+        self._files = {}    # ファイル名 → (ファイル名, 更新日時, フルパス)
+        self._by_date = {}  # (月, 日) → [ファイル名, ...]
+        self._dir_mtime = None
+        self._scanned = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """フォルダを読み直したら True。"""
+        with self._lock:
+            dir_mtime = os.stat(self.import_path).st_mtime
+            now = time.monotonic()
+            if (not force and dir_mtime == self._dir_mtime
+                    and self._scanned is not None and now - self._scanned < self.max_age):
+                return False
+            current = {entry[0]: entry for entry in scan_schedule_folder(self.import_path)}
+            for name in self._files.keys() - current.keys():
+                self._unindex(name)
+            for name, entry in current.items():
+                if name not in self._files:
+                    for key in dates_in_name(name):
+                        names = self._by_date.setdefault(key, [])
+                        names.append(name)
+                        names.sort()
+            self._files = current
+            self._dir_mtime = dir_mtime
+            self._scanned = now
+            return True
+
+    def _unindex(self, name):
+        for key in dates_in_name(name):
+            names = self._by_date.get(key)
+            if names and name in names:
+                names.remove(name)
+                if not names:
+                    del self._by_date[key]
+
+    def candidates(self, month, day, refresh=True):
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return [self._files[name] for name in self._by_date.get((month, day), ())]
+
+    def files(self, refresh=True):
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return list(self._files.values())
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_schedule_index(import_path):
+    """フォルダごとに1つの索引を返す（同じプロセス内の GUI・処理・先読みで共有する）。"""
+    key = os.path.normcase(os.path.normpath(import_path.rstrip("\\")))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ScheduleIndex(import_path)
+    return index
@@ -1,41 +1,268 @@
 # -*- coding: utf-8 -*-
 import os
 import tempfile
-import re
-from datetime import datetime
+import io
+import csv
+import json
+import hashlib
+import threading
+import time
+from copy import copy
+from collections import namedtuple, Counter
+from contextlib import contextmanager
+from datetime import datetime, date, time as dt_time, timedelta
 from dateutil.relativedelta import relativedelta
 import openpyxl
-import win32com.client
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import from_excel, WINDOWS_EPOCH, MAC_EPOCH
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_REVERSE
+from schedule_timing import PhaseTimer, profiled
+from schedule_progress import ProgressToken, ScheduleCancelled
+from schedule_history import HISTORY_DB, record_run
+from schedule_index import ScheduleIndex, get_schedule_index, scan_schedule_folder, dates_in_name
 
 DEFAULT_IMPORT = r"\\PC011\Users\yasumoku\Desktop\タカラ関係\工程表"
 DEFAULT_OUTPUT = r"\\PC009\share01\日程表"
+REQUEST_FILE = os.path.normpath(r"\\PC009\share01\依頼現場名 R1.xls")
+SCHEDULE_TEMPLATE = os.path.normpath(r"\\PC009\share01\日程表\生産日程表★.xlsx")
 
-def convert_xls_to_xlsx(xls_path):
+# 依頼現場名の解析済みスナップショット置き場（他PCからも共有して使う）
+SNAPSHOT_DIR = os.path.normpath(r"\\PC009\share01\.schedule_cache")
+SNAPSHOT_VERSION = 2
+
+# 出力の横に置くマニフェスト（入力の指紋と集計結果）とロックファイル
+MANIFEST_VERSION = 2
+REVISION_VERSION = 2  # 前回作成時の記録（_revision_path）の形式
+LOCK_STALE_SECONDS = 600  # これより古いロックは異常終了の残骸とみなす
+
+# --- ファイル入出力 ---
+# 共有フォルダ上のファイルは小さな読み書きを繰り返すと遅いので、まとめて1回で読み書きする。
+def read_file_bytes(path):
+    """ファイル全体を1回の連続読み込みでバイト列にする。"""
+    with open(path, "rb", buffering=0) as fp:
+        return fp.read()
+
+def write_file_atomic(path, data):
+    """
+    バイト列を1回の書き込みで保存する。
+    同じフォルダの一時ファイルに書いてから置き換えるので、読む側が書きかけのファイルを見ることはない。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb", buffering=0) as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# --- 共有に置くキャッシュ（スナップショット・前回の記録）の形式 ---
+# 共有は誰でも書けるので、読み込んでもコードが実行されない JSON にする（pickle は使わない）。
+# JSON に無い日時型は {"$datetime": "ISO形式"} のように型名付きで入れる。タプルはリストになるので、読む側で戻す。
+_CACHE_TYPES = {"$datetime": datetime, "$date": date, "$time": dt_time}
+
+def _cache_default(value):
+    if isinstance(value, timedelta):
+        return {"$timedelta": value.total_seconds()}
+    for tag, cls in _CACHE_TYPES.items():
+        if type(value) is cls:
+            return {tag: value.isoformat()}
+    raise TypeError(f"キャッシュに保存できない値です: {type(value).__name__}")
+
+def _cache_object(obj):
+    if len(obj) == 1:
+        (tag, text), = obj.items()
+        if tag == "$timedelta":
+            return timedelta(seconds=text)
+        if tag in _CACHE_TYPES:
+            return _CACHE_TYPES[tag].fromisoformat(text)
+    return obj
+
+def encode_cache(obj):
+    """キャッシュ用のバイト列（JSON）にする。"""
+    return json.dumps(obj, ensure_ascii=False, default=_cache_default, separators=(",", ":")).encode("utf-8")
+
+def decode_cache(data):
+    """encode_cache の逆。リストはリストのまま返す。"""
+    return json.loads(data.decode("utf-8"), object_hook=_cache_object)
+
+def _excel_pid(excel):
+    """Excel のプロセスID。COM のプロキシは作ったスレッドでしか使えないので、DispatchEx と同じスレッドで呼ぶ。"""
+    import win32process
+    _, pid = win32process.GetWindowThreadProcessId(excel.Hwnd)
+    return pid
+
+def _kill_excel(pid):
+    """COM 呼び出し中でも止められるよう、Excel のプロセスを強制終了する（中止したスレッドから呼ばれる）。"""
+    os.kill(pid, 9)
+
+def convert_xls_to_xlsx(xls_path, token=None):
+    import win32com.client
     excel = win32com.client.DispatchEx("Excel.Application")
-    wb = excel.Workbooks.Open(xls_path)
     tmp_fd, tmp_path = tempfile.mkstemp(suffix=".xlsx")
     os.close(tmp_fd)
     os.remove(tmp_path)
-    wb.SaveAs(tmp_path, FileFormat=51)
-    wb.Close(False)
-    excel.Quit()
+    try:
+        if token is not None:
+            pid = _excel_pid(excel)
+            with token.on_cancel(lambda: _kill_excel(pid)):
+                wb = excel.Workbooks.Open(xls_path)
+                wb.SaveAs(tmp_path, FileFormat=51)
+                wb.Close(False)
+            token.check()
+        else:
+            wb = excel.Workbooks.Open(xls_path)
+            wb.SaveAs(tmp_path, FileFormat=51)
+            wb.Close(False)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if token is not None:
+            # 中止で Excel を強制終了すると COM エラーになるので、読み込み失敗ではなく中止として返す
+            token.check()
+        raise
+    finally:
+        try:
+            excel.Quit()
+        except Exception:
+            pass  # 中止で強制終了済み
+    if token is not None:
+        token.check()
     return tmp_path
 
-def read_excel_sheet(file_path, sheet_name):
-    ext = os.path.splitext(file_path)[1].lower()
-    tmp_xlsx = None
-    if ext == ".xlsx":
-        wb = openpyxl.load_workbook(file_path, data_only=True)
-        ws = wb[sheet_name]
-        return wb, ws, tmp_xlsx
-    elif ext == ".xls":
-        tmp_xlsx = convert_xls_to_xlsx(file_path)
-        wb = openpyxl.load_workbook(tmp_xlsx, data_only=True)
+# --- 読み込みバックエンド ---
+# どれも min_row〜max_row 行目、A〜max_col 列の値タプルのリストを返す（空セルは None）。
+# max_row / max_col が None ならシートの最後まで。token があれば 1000 行ごとに進捗を送り、中止を確認する。
+# data: read_file_bytes で読み込み済みのファイル内容。渡されなければ file_path から読む。
+def _read_xlsx_openpyxl(file_path, sheet_name, min_row=1, max_row=None, max_col=None, token=None, data=None):
+    if data is None:
+        data = read_file_bytes(file_path)
+    # read_only: Cell オブジェクトを作らず、指定シートの XML を順に読むだけ（メモリ上のバイト列から）
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
         ws = wb[sheet_name]
-        return wb, ws, tmp_xlsx
-    else:
+        total = ws.max_row or 0
+        rows = []
+        for row in ws.iter_rows(min_row=min_row, max_row=max_row, max_col=max_col, values_only=True):
+            rows.append(tuple(row))
+            if token is not None and len(rows) % 1000 == 0:
+                token.advance(len(rows), total)
+        return rows
+    finally:
+        wb.close()
+
+def _xlrd_value(cell, datemode):
+    """xlrd のセルを openpyxl(data_only) で読んだときと同じ値にそろえる。"""
+    import xlrd
+    ctype = cell.ctype
+    if ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if ctype == xlrd.XL_CELL_NUMBER:
+        v = cell.value
+        # xlsx では整数値は "5" のように保存され、openpyxl は int で返す
+        if v.is_integer() and abs(v) < 1e15:
+            return int(v)
+        return v
+    if ctype == xlrd.XL_CELL_DATE:
+        return from_excel(cell.value, MAC_EPOCH if datemode else WINDOWS_EPOCH)
+    if ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    if ctype == xlrd.XL_CELL_ERROR:
+        return xlrd.error_text_from_code.get(cell.value)
+    return cell.value
+
+def _read_xls_xlrd(file_path, sheet_name, min_row=1, max_row=None, max_col=None, token=None, data=None):
+    import xlrd
+    if data is None:
+        data = read_file_bytes(file_path)
+    # on_demand: 指定シート以外は解析しない
+    book = xlrd.open_workbook(file_contents=data, on_demand=True)
+    try:
+        sh = book.sheet_by_name(sheet_name)
+        if token is not None:
+            token.check()  # シートの解析（BIFF の読み込み）が終わったところ
+        datemode = book.datemode
+        last_row = sh.nrows if max_row is None else min(max_row, sh.nrows)
+        rows = []
+        for r in range(min_row - 1, last_row):
+            cells = sh.row_slice(r, 0, max_col)
+            values = tuple(_xlrd_value(cell, datemode) for cell in cells)
+            if max_col is not None and len(values) < max_col:
+                values += (None,) * (max_col - len(values))  # openpyxl と同じく max_col まで埋める
+            rows.append(values)
+            if token is not None and len(rows) % 1000 == 0:
+                token.advance(len(rows), last_row)
+        return rows
+    finally:
+        book.release_resources()
+
+def _read_xls_com(file_path, sheet_name, min_row=1, max_row=None, max_col=None, token=None, data=None):
+    # Excel はパスしか開けないので元ファイルを直接開く。変換結果はすぐメモリに読んで消す
+    tmp_xlsx = convert_xls_to_xlsx(file_path, token)
+    try:
+        converted = read_file_bytes(tmp_xlsx)
+    finally:
+        if os.path.exists(tmp_xlsx):
+            os.remove(tmp_xlsx)
+    return _read_xlsx_openpyxl(tmp_xlsx, sheet_name, min_row, max_row, max_col, token, converted)
+
+READER_BACKENDS = {
+    "openpyxl": _read_xlsx_openpyxl,
+    "xlrd": _read_xls_xlrd,
+    "com": _read_xls_com,
+}
+
+# 拡張子ごとの試行順（先頭から順に使えるものを使う。COM は最後の手段）
+READER_ORDER = {
+    ".xlsx": ("openpyxl",),
+    ".xls": ("xlrd", "com"),
+}
+
+def read_excel_sheet(file_path, sheet_name, backend=None, min_row=1, max_row=None, max_col=None, token=None):
+    """
+    シートの値だけを読み込み、行ごとの値タプルのリストを返す（ブックはすぐ閉じる）。
+    - min_row / max_row / max_col: 読む範囲（A列〜max_col列）。使う範囲だけ読むと速い
+    - min_row より前の行は空タプルで埋めるので、sheet_value の行番号はそのまま使える
+    - backend: "openpyxl" / "xlrd" / "com" を指定すると、そのバックエンドだけを使う
+    - 指定しなければ READER_ORDER の順に試し、失敗したら次のバックエンドに回す
+    - token: ProgressToken。読み込み中の進捗通知と中止確認に使う
+    - ファイルは最初に1回だけまとめて読み、どのバックエンドもメモリ上の内容を解析する
+    """
+    if backend is not None:
+        return [()] * (min_row - 1) + READER_BACKENDS[backend](file_path, sheet_name, min_row, max_row, max_col, token)
+
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in READER_ORDER:
         raise ValueError("対応していないファイル形式です")
 
+    data = read_file_bytes(file_path)
+    errors = []
+    for name in READER_ORDER[ext]:
+        try:
+            rows = READER_BACKENDS[name](file_path, sheet_name, min_row, max_row, max_col, token, data)
+            return [()] * (min_row - 1) + rows
+        except (FileNotFoundError, ScheduleCancelled):
+            raise
+        except Exception as e:
+            # モジュール未導入・Excel 未インストール・読めない形式など → 次を試す
+            errors.append(f"{name}: {e}")
+    raise ValueError(f"ファイルを読み込めません: {file_path}\n" + "\n".join(errors))
+
+def sheet_value(rows, col, row):
+    """read_excel_sheet の戻り値から、列記号と行番号(1始まり)でセル値を取る。範囲外は None。"""
+    if row < 1 or row > len(rows):
+        return None
+    values = rows[row - 1]
+    idx = column_index_from_string(col) - 1
+    if idx >= len(values):
+        return None
+    return values[idx]
+
 def parse_excel_date(value):
     if value is None:
         return None
@@ -71,27 +298,666 @@ def safe_int(v):
     except:
         return 0
 
-def create_schedule(year, month, day, filter_type, import_path=DEFAULT_IMPORT, output_path=DEFAULT_OUTPUT, gui_select_file_func=None):
+def parse_request_rows(sheet_rows, token=None):
+    """
+    依頼シート(Sheet3)のA〜G列を解析済みの行リストにする。
+    - 各行: (正規化したC列キー, A〜F列の値タプル, G列の日付)
+    - C列が空の行は除く
+    """
+    rows = []
+    total = len(sheet_rows) - 1
+    for n, row in enumerate(sheet_rows[1:], start=1):
+        if token is not None and n % 1000 == 0:
+            token.advance(n, total)
+        row = tuple(row[:7]) + (None,) * (7 - len(row))
+        if row[2] is None:
+            continue
+        rows.append((normalize_key(row[2]), row[:6], parse_excel_date(row[6])))
+    return rows
+
+def _snapshot_path(file_path, sheet_name, snapshot_dir):
+    ident = f"{os.path.normcase(os.path.abspath(file_path))}|{sheet_name}"
+    digest = hashlib.sha1(ident.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(snapshot_dir, f"{digest}.json")
+
+def load_request_rows(request_file=REQUEST_FILE, sheet_name="Sheet3", snapshot_dir=SNAPSHOT_DIR, token=None):
+    """
+    依頼シートの解析済み行を返す。
+    - snapshot_dir にパス・更新日時・サイズが一致するスナップショットがあればそれを使う
+    - なければ Excel を読み込んで解析し、スナップショットを書き出す
+    - snapshot_dir=None ならキャッシュを使わない
+    """
+    st = os.stat(request_file)
+    stamp = (SNAPSHOT_VERSION, os.path.normcase(os.path.abspath(request_file)), sheet_name, st.st_mtime, st.st_size)
+
+    snapshot_file = None
+    if snapshot_dir:
+        snapshot_file = _snapshot_path(request_file, sheet_name, snapshot_dir)
+        rows = None
+        try:
+            cached = decode_cache(read_file_bytes(snapshot_file))
+            if cached["stamp"] == list(stamp):
+                rows = [(key, tuple(row), req_g) for key, row, req_g in cached["rows"]]
+        except Exception:
+            pass  # 無い・壊れている・古い形式 → 読み直す
+        if rows is not None:
+            if token is not None:
+                token.check()  # 大きなスナップショットの復元中に押された中止をここで拾う
+            return rows
+
+    rows = parse_request_rows(read_excel_sheet(request_file, sheet_name, max_col=7, token=token), token)
+
+    if snapshot_file:
+        try:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            write_file_atomic(snapshot_file, encode_cache({"stamp": stamp, "rows": rows}))
+        except (OSError, TypeError):
+            pass  # 共有に書けなくても（保存できない値があっても）処理は続ける
+    return rows
+
+def build_request_index(request_rows):
+    """
+    解析済みの依頼行を正規化キーごとにまとめる。
+    - 値: [(A〜F列の値タプル, G列の日付), ...]（シート上の行順）
+    """
+    index = {}
+    for key, row, req_g in request_rows:
+        index.setdefault(key, []).append((row, req_g))
+    return index
+
+# 出力シートに書く列（G, H はテンプレートのまま）
+OUTPUT_COLUMNS = ("A", "B", "C", "D", "E", "F", "I")
+
+# --- 工程表 Sheet1 のレイアウト ---
+SCHEDULE_FIRST_ROW = 3  # 1〜2行目は見出し
+
+# 工程表の台数ブロック: (現場キー列, 図面列, 品名列, 台数列)。後のブロックほど優先
+SCHEDULE_BLOCKS = (("C", "D", "E", "F"), ("I", "J", "K", "L"))
+SCHEDULE_BLOCK_STRIDE = 6  # ブロックの間隔（列数）
+
+# first_row〜last_row 行目の、blocks の各ブロックを読む
+ScheduleLayout = namedtuple("ScheduleLayout", ["first_row", "last_row", "blocks"])
+
+def _has_value(v):
+    return v is not None and not (isinstance(v, str) and not v.strip())
+
+def _block_header(schedule_rows, block, first_row):
+    return tuple(sheet_value(schedule_rows, col, r) for r in range(1, first_row) for col in block)
+
+def detect_schedule_layout(schedule_rows, first_row=SCHEDULE_FIRST_ROW):
+    """
+    工程表の使われている範囲を調べる。
+    - blocks: SCHEDULE_BLOCKS と、その右に同じ間隔・同じ見出しで続くブロック
+    - last_row: どれかのブロックの列に値がある最後の行（何ページ分あってもよい）
+    """
+    blocks = list(SCHEDULE_BLOCKS)
+    width = max((len(values) for values in schedule_rows), default=0)
+    header = _block_header(schedule_rows, blocks[-1], first_row)
+    while any(_has_value(v) for v in header):
+        block = tuple(get_column_letter(column_index_from_string(col) + SCHEDULE_BLOCK_STRIDE) for col in blocks[-1])
+        if column_index_from_string(block[-1]) > width or _block_header(schedule_rows, block, first_row) != header:
+            break
+        blocks.append(block)
+
+    indexes = [column_index_from_string(col) - 1 for block in blocks for col in block]
+    last_row = first_row - 1
+    for r in range(len(schedule_rows), first_row - 1, -1):
+        values = schedule_rows[r - 1]
+        if any(_has_value(values[i]) for i in indexes if i < len(values)):
+            last_row = r
+            break
+    return ScheduleLayout(first_row, last_row, tuple(blocks))
+
+def extract_schedule_blocks(schedule_rows, layout=None):
+    """
+    工程表からブロックごとの行を取り出す。突き合わせ・台数の上書き・集計はすべてこの結果を使う。
+    - 戻り値: ブロックごとの [(現場キー, 図面, 品名, 台数), ...]（上の行から順。空行も含む）
+    - layout を省略すると detect_schedule_layout で調べる
+    """
+    if layout is None:
+        layout = detect_schedule_layout(schedule_rows)
+    blocks = []
+    for block in layout.blocks:
+        indexes = [column_index_from_string(col) - 1 for col in block]
+        records = []
+        for values in schedule_rows[layout.first_row - 1:layout.last_row]:
+            records.append(tuple(values[i] if i < len(values) else None for i in indexes))
+        blocks.append(records)
+    return blocks
+
+def build_backfill_index(schedule_blocks):
+    """
+    工程表から (正規化キー, 図面, 品名) → 台数 の表を作る。
+    - 同じブロック内では上の行が優先、ブロック間では後のブロックが優先
+    """
+    lookup = {}
+    for records in schedule_blocks:
+        block = {}
+        for key_val, drawing, name, qty in records:
+            block.setdefault((normalize_key(key_val), drawing, name), qty)
+        lookup.update(block)
+    return lookup
+
+def list_schedule_files(import_path):
+    """
+    工程表フォルダを1回だけ走査し、.xls/.xlsx の (ファイル名, 更新日時, フルパス) を返す。
+    - scandir の stat は Windows ではキャッシュ済みなので、ファイルごとの問い合わせが発生しない
+    """
+    return scan_schedule_folder(import_path)
+
+def find_schedule_candidates(schedule_files, month, day):
+    """
+    ファイル名の「月-日」が month/day の工程表を選ぶ（10-25 / 010-25 は可、1-1 に 11-1 や 1-10 は含めない）。
+    - schedule_files: ScheduleIndex（索引から直接引く）または list_schedule_files の結果
+    """
+    if isinstance(schedule_files, ScheduleIndex):
+        return schedule_files.candidates(month, day)
+    return sorted((c for c in schedule_files if (month, day) in dates_in_name(c[0])), key=lambda c: c[0])
+
+def _match_requests(requests, filter_type, start_date, end_date):
+    # 1つの現場キーの依頼行から、期間・フィルターに合うものを行順に選ぶ
+    matches = []
+    for req_row, req_g in requests:
+        if req_g is None or req_g < start_date or req_g > end_date:
+            continue
+        if filter_type == "dollar":
+            val_d = str(req_row[3] or "").strip()
+            if not (val_d.startswith("$") or val_d.startswith("＄")):
+                continue
+        matches.append(req_row)
+    return matches
+
+def join_schedule(schedule_blocks, request_index, filter_type, target_date, start_date, end_date, token=None,
+                  joined=None):
+    """
+    工程表の各ブロックの現場キー（C列・I列…）を依頼行と突き合わせ、出力行のリストを返す。
+    - schedule_blocks: extract_schedule_blocks の戻り値
+    - 出力1行 = [A, B, C, D, E, F, I] の値（OUTPUT_COLUMNS の順）
+    - G列の日付が start_date〜end_date の依頼行だけ、A〜F列が同じ行は1回だけ
+    - joined: 正規化キー → 突き合わせ済みの依頼行 の辞書。あるキーはそのまま使い、無いキーだけ
+      request_index と突き合わせて追加する（全キーがあれば request_index は None でよい）
+    """
+    if joined is None:
+        joined = {}
+    written_rows = set()
+    out_rows = []
+    target_date_str = target_date.strftime("%Y/%m/%d")
+
+    total = sum(len(records) for records in schedule_blocks)
+    done = 0
+    for records in schedule_blocks:
+        for key_val, _, _, _ in records:
+            done += 1
+            if token is not None:
+                token.advance(done, total)
+            if key_val is None:
+                continue
+            key_val_str = normalize_key(key_val)
+            matches = joined.get(key_val_str)
+            if matches is None:
+                matches = joined[key_val_str] = _match_requests(request_index.get(key_val_str, ()),
+                                                                filter_type, start_date, end_date)
+            for req_row in matches:
+                if req_row in written_rows:
+                    continue
+                written_rows.add(req_row)
+
+                val_a, val_b, val_c, val_d_raw, val_e, val_f = req_row
+                out_rows.append([str(val_c or "").strip(), target_date_str, val_a, val_e, val_d_raw, val_b, val_f])
+    return out_rows
+
+def apply_backfill(out_rows, schedule_blocks):
+    """工程表の台数で出力行の I 列を上書きする（I/J/K/L ブロックが C/D/E/F ブロックより優先）。"""
+    backfill = build_backfill_index(schedule_blocks)
+    for out in out_rows:
+        key = (normalize_key(out[0]), out[5], out[3])
+        if key in backfill:
+            out[6] = backfill[key]
+
+def schedule_keys(schedule_blocks):
+    """工程表に出てくる正規化済みの現場キーの集合。"""
+    return {normalize_key(key_val) for records in schedule_blocks for key_val, _, _, _ in records
+            if key_val is not None}
+
+def diff_schedule_records(old_blocks, new_blocks):
+    """
+    前回と今回の工程表の行（現場キー, 図面, 品名, 台数）を比べる。
+    - 戻り値: (増えた行のリスト, 消えた行のリスト)。並び替えだけの行は含めない
+    - 全項目が空の行は数えない（最終行が動くと空行の数が変わるだけなので）
+    """
+    old = Counter(record for records in old_blocks for record in records if not all(map(_is_blank, record)))
+    new = Counter(record for records in new_blocks for record in records if not all(map(_is_blank, record)))
+    return list((new - old).elements()), list((old - new).elements())
+
+def diff_output_rows(old_rows, new_rows):
+    """
+    前回と今回の出力行を比べる。A〜F列が同じ行を同じ行とみなし、台数（I列）の違いを「変更」とする。
+    - 戻り値: {"added": [行, ...], "removed": [行, ...], "changed": [(前回の行, 今回の行), ...]}
+    """
+    old = {tuple(out[:6]): out for out in old_rows}
+    new = {tuple(out[:6]): out for out in new_rows}
+    return {
+        "added": [out for ident, out in new.items() if ident not in old],
+        "removed": [out for ident, out in old.items() if ident not in new],
+        "changed": [(old[ident], out) for ident, out in new.items() if ident in old and old[ident][6] != out[6]],
+    }
+
+# 集計の区分（summarize_schedule の戻り値の順。最後に合計が付く）
+SUMMARY_KEYS = ("gifu_new", "shiga_new", "gifu_old", "shiga_old", "shiga_spec", "total_sum")
+
+def schedule_columns(schedule_blocks):
+    """全ブロックの行をまとめ、(現場キー, 図面, 品名, 台数) の列ごとのタプルにする。"""
+    records = [record for records in schedule_blocks for record in records]
+    if not records:
+        return (), (), (), ()
+    return tuple(zip(*records))
+
+def _is_blank(v):
+    return v is None or str(v).strip() == ""
+
+def _is_new_drawing(d):
+    return isinstance(d, str) and d.startswith(("$", "＄"))
+
+def _is_gifu_key(c):
+    # 現場キーが英字で始まれば岐阜
+    first = str(c or "").strip()[:1]
+    return first.isascii() and first.isalpha()
+
+def summarize_schedule(schedule_blocks):
+    """
+    メッセージ用の集計。
+    - 戻り値: (岐阜新, 滋賀新, 岐阜旧, 滋賀旧, 滋賀規格, 合計)
+    - 全ブロックを列ごとの配列にしてから、行ごとの区分を1回で決めて足し込む
+    """
+    keys, drawings, names, qtys = schedule_columns(schedule_blocks)
+    qtys = [safe_int(v) for v in qtys]
+
+    # 区分: 0=岐阜新 1=滋賀新 2=岐阜旧 3=滋賀旧 4=滋賀規格（現場キー・品名が空で台数あり。新旧には含めない）
+    categories = [
+        4 if q and _is_blank(c) and _is_blank(e) else (0 if _is_gifu_key(c) else 1) + (0 if _is_new_drawing(d) else 2)
+        for c, d, e, q in zip(keys, drawings, names, qtys)
+    ]
+    totals = [0] * 5
+    for category, q in zip(categories, qtys):
+        totals[category] += q
+
+    gifu_new_total, shiga_new_total, gifu_old_total, shiga_old_total, shiga_spec_total = totals
+    total_sum = sum(totals)
+    return gifu_new_total, shiga_new_total, gifu_old_total, shiga_old_total, shiga_spec_total, total_sum
+
+def summarize_schedules(start_date, end_date, import_path=DEFAULT_IMPORT, schedule_files=None, token=None):
+    """
+    start_date〜end_date（両端を含む）の各日の工程表から集計だけを行う（月ごとの合計など）。
+    - 依頼現場名・テンプレートは読まず、出力ファイルも作らない
+    - 同じ日の工程表が複数あれば create_schedule と同じく最初の候補を使う
+    - 戻り値: [(日付, 工程表のパス or None, summarize_schedule の戻り値 or None, エラーメッセージ or None), ...]
+      工程表が無い日はパス・集計とも None（エラーにはしない）
+    """
+    if schedule_files is None:
+        schedule_files = get_schedule_index(import_path)
+    results = []
+    d = start_date
+    while d <= end_date:
+        candidates = find_schedule_candidates(schedule_files, d.month, d.day)
+        if not candidates:
+            results.append((d, None, None, None))
+        else:
+            schedule_file = candidates[0][2]
+            if token is not None:
+                token.stage(os.path.basename(schedule_file))
+            try:
+                schedule_rows = read_excel_sheet(schedule_file, 'Sheet1', token=token)
+                results.append((d, schedule_file, summarize_schedule(extract_schedule_blocks(schedule_rows)), None))
+            except ScheduleCancelled:
+                raise
+            except Exception as e:
+                results.append((d, schedule_file, None, str(e)))
+        d += timedelta(days=1)
+    return results
+
+# --- 出力の書き出し ---
+# テンプレートのブック全体の書式（フォント・罫線・表示形式などの表とテーマ）
+_WORKBOOK_STYLE_ATTRS = (
+    "_fonts", "_alignments", "_borders", "_fills", "_number_formats", "_date_formats", "_timedelta_formats",
+    "_protections", "_colors", "_cell_styles", "_named_styles", "_table_styles", "_differential_styles",
+    "loaded_theme", "properties", "custom_doc_props", "calculation", "defined_names", "security", "views",
+    "epoch", "code_name",
+)
+# テンプレートのシート設定（列幅・ウィンドウ枠・印刷設定など）
+_SHEET_SETTING_ATTRS = (
+    "sheet_properties", "sheet_format", "views", "page_setup", "print_options", "page_margins", "HeaderFooter",
+    "auto_filter", "protection", "merged_cells", "data_validations", "conditional_formatting",
+    "row_breaks", "col_breaks", "sheet_state", "defined_names", "scenarios",
+    "_print_rows", "_print_cols", "_print_area",
+)
+
+def _streamable(template_wb):
+    """書き込み専用ブックで同じ内容を再現できるテンプレートなら True。"""
+    if len(template_wb._sheets) != 1 or template_wb.vba_archive is not None:
+        return False
+    ws = template_wb.active
+    if ws._images or ws._charts or ws._tables or ws._pivots or ws.legacy_drawing:
+        return False
+    return not any(cell.hyperlink is not None or cell.comment is not None for cell in ws._cells.values())
+
+def _write_output_template(template_wb, out_rows, token=None):
+    # テンプレートのシートにセルごとに書き込む（どんなテンプレートでも使える）
+    ws_out = template_wb.active
+    for out_row, out in enumerate(out_rows, start=2):
+        if token is not None and out_row % 1000 == 0:
+            token.advance(out_row - 1, len(out_rows))
+        for col, value in zip(OUTPUT_COLUMNS, out):
+            ws_out[f"{col}{out_row}"] = value
+        ws_out[f"A{out_row}"].number_format = '@'
+    buf = io.BytesIO()
+    template_wb.save(buf)
+    template_wb.close()
+    return buf.getvalue()
+
+def _write_output_stream(template_wb, out_rows, token=None):
+    """
+    書き込み専用ブックに、テンプレートの書式とシート設定を写してから行を順に流し込む。
+    セル単位の読み書きをしないので速く、出力行が増えてもメモリが増えない。
+    """
+    src = template_wb.active
+    wb = openpyxl.Workbook(write_only=True)
+    for attr in _WORKBOOK_STYLE_ATTRS:
+        setattr(wb, attr, getattr(template_wb, attr))
+    ws = wb.create_sheet(src.title)
+    for attr in _SHEET_SETTING_ATTRS:
+        setattr(ws, attr, getattr(src, attr))
+    for holder_name in ("column_dimensions", "row_dimensions"):
+        holder = getattr(ws, holder_name)
+        for key, dim in getattr(src, holder_name).items():
+            dim = copy(dim)
+            dim.parent = ws
+            holder[key] = dim
+
+    # テンプレートの行: 行番号 → {列番号: (値, 書式)}
+    template_rows = {}
+    for (r, c), cell in src._cells.items():
+        template_rows.setdefault(r, {})[c] = (cell._value, cell._style)
+
+    # 出力列の書式を列ごとに先に決めておく（A列は文字列 '@'）
+    out_cols = [column_index_from_string(col) for col in OUTPUT_COLUMNS]
+    text_fmt = BUILTIN_FORMATS_REVERSE["@"]
+    def out_style(style, col):
+        if col != out_cols[0]:
+            return style
+        style = StyleArray(style)
+        style.numFmtId = text_fmt
+        return style
+    default_styles = {col: out_style(StyleArray(), col) for col in out_cols}
+
+    last_row = max(max(template_rows, default=1), len(out_rows) + 1)
+    last_col = max(max((c for _, c in src._cells), default=1), max(out_cols))
+    try:
+        for r in range(1, last_row + 1):
+            if token is not None and r % 1000 == 0:
+                token.advance(r, last_row)
+            cells = dict(template_rows.get(r, ()))
+            if 2 <= r <= len(out_rows) + 1:
+                for col, value in zip(out_cols, out_rows[r - 2]):
+                    base = cells.get(col)
+                    style = out_style(base[1], col) if base is not None else default_styles[col]
+                    cells[col] = (value, style)
+            row = [None] * last_col
+            for col, (value, style) in cells.items():
+                if not any(style):
+                    row[col - 1] = value  # 書式なしは値のまま渡す
+                    continue
+                cell = WriteOnlyCell(ws)
+                cell._style = copy(style)
+                cell.value = value
+                row[col - 1] = cell
+            ws.append(row)
+    except ScheduleCancelled:
+        ws.close()  # 書きかけのシートを閉じてから中止する（一時ファイルは openpyxl が終了時に消す）
+        raise
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+OUTPUT_WRITERS = {
+    "stream": _write_output_stream,
+    "template": _write_output_template,
+}
+
+def render_output(template_wb, out_rows, backend=None, token=None):
+    """
+    出力行(join_schedule の戻り値)をテンプレートの2行目から書き込んだ xlsx のバイト列を返す。
+    - template_wb: openpyxl で開いたテンプレート（書き出し後は使えない）
+    - backend: "stream"（書き込み専用で流し込む）/ "template"（テンプレートのセルに書く）
+    - 指定しなければ stream。テンプレートに画像・グラフ・コメントなど再現できない要素があれば template
+    - token: 1000行ごとに進捗を知らせ、中止を確認する
+    """
+    if backend is None:
+        backend = "stream" if _streamable(template_wb) else "template"
+    return OUTPUT_WRITERS[backend](template_wb, out_rows, token)
+
+# --- xlsx 以外の出力（プログラムから読む用） ---
+# 形式 → 拡張子。どれも出力シートと同じ行（A〜I列、G/H は空）を持つ
+EXPORT_FORMATS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv",               # 見出し行 A〜I + 出力行 + 空行 + 集計（UTF-8 BOM 付き。Excel でもそのまま開ける）
+    "jsonl": ".jsonl",           # 1行目 {"date", "filter_type", "rows", "totals"}、2行目以降 {"A": …, "I": …}
+    "columnar": ".columns.json", # {"date", "filter_type", "rows", "totals", "columns": {"A": [...], …, "I": [...]}}
+}
+EXPORT_COLUMNS = ("A", "B", "C", "D", "E", "F", "G", "H", "I")
+
+def export_paths(output_path, year, month, day, formats):
+    """形式ごとの出力ファイルのパス（YYYYMMDD_生産日程表★ + 拡張子）。"""
+    base = os.path.join(output_path, f"{year:04d}{month:02d}{day:02d}_生産日程表★")
+    return {fmt: os.path.normpath(base + EXPORT_FORMATS[fmt]) for fmt in formats}
+
+def _export_value(v):
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    return v
+
+def render_exports(out_rows, summary, formats, date_text, filter_type):
+    """
+    出力行と集計を csv / jsonl / columnar のバイト列にする（行は1回だけたどる）。
+    - summary: summarize_schedule の戻り値
+    - 戻り値: {形式: バイト列}（formats のうち xlsx 以外）
+    """
+    header = {"date": date_text, "filter_type": filter_type, "rows": len(out_rows),
+              "totals": dict(zip(SUMMARY_KEYS, (int(v) for v in summary)))}
+    csv_buf = csv_writer = jsonl_lines = columns = None
+    if "csv" in formats:
+        csv_buf = io.StringIO()
+        csv_writer = csv.writer(csv_buf, lineterminator="\r\n")
+        csv_writer.writerow(EXPORT_COLUMNS)
+    if "jsonl" in formats:
+        jsonl_lines = [json.dumps(header, ensure_ascii=False)]
+    if "columnar" in formats:
+        columns = {col: [] for col in EXPORT_COLUMNS}
+
+    for out in out_rows:
+        a, b, c, d, e, f, i = (_export_value(v) for v in out)
+        values = (a, b, c, d, e, f, None, None, i)
+        if csv_writer is not None:
+            csv_writer.writerow(["" if v is None else v for v in values])
+        if jsonl_lines is not None:
+            jsonl_lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+        if columns is not None:
+            for col, v in zip(EXPORT_COLUMNS, values):
+                columns[col].append(v)
+
+    data = {}
+    if csv_buf is not None:
+        # 集計は出力行の後に空行をはさんで置く（xlsx の集計欄・jsonl の見出しと同じ値）
+        csv_writer.writerow([])
+        csv_writer.writerow(SUMMARY_KEYS)
+        csv_writer.writerow(header["totals"].values())
+        data["csv"] = csv_buf.getvalue().encode("utf-8-sig")
+    if jsonl_lines is not None:
+        data["jsonl"] = ("\n".join(jsonl_lines) + "\n").encode("utf-8")
+    if columns is not None:
+        data["columnar"] = json.dumps(dict(header, columns=columns), ensure_ascii=False).encode("utf-8")
+    return data
+
+# --- 出力の再利用（マニフェスト）と同時実行の抑止（ロック） ---
+def input_fingerprint(paths, *values):
+    """入力ファイルのパス・更新日時・サイズと、その他の条件から指紋を作る。"""
+    h = hashlib.sha1(f"v{MANIFEST_VERSION}".encode("utf-8"))
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"|{os.path.normcase(os.path.abspath(path))}|{st.st_mtime}|{st.st_size}".encode("utf-8"))
+    h.update(repr(values).encode("utf-8"))
+    return h.hexdigest()
+
+def _revision_path(base_file, snapshot_dir):
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(base_file)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(snapshot_dir, f"revision_{digest}.json")
+
+def load_revision(revision_file):
+    """前回作成時の記録（工程表の行・突き合わせ結果・出力行）。無い・壊れている・古い形式なら None。"""
+    try:
+        record = decode_cache(read_file_bytes(revision_file))
+        if not isinstance(record, dict) or record.get("version") != REVISION_VERSION:
+            return None
+        # JSON ではタプルがリストになるので、比較・集合に使う行はタプルに戻す
+        record["blocks"] = [[tuple(r) for r in records] for records in record["blocks"]]
+        record["joined"] = {key: [tuple(row) for row in rows] for key, rows in record["joined"].items()}
+        return record
+    except Exception:
+        return None
+
+def save_revision(revision_file, record):
+    try:
+        os.makedirs(os.path.dirname(revision_file), exist_ok=True)
+        write_file_atomic(revision_file, encode_cache(dict(record, version=REVISION_VERSION)))
+    except (OSError, TypeError):
+        pass  # 共有に書けなくても処理は続ける（次回は全件で突き合わせる）
+
+def _manifest_path(save_file):
+    return f"{save_file}.manifest.json"
+
+def _output_stamps(files):
+    stamps = {}
+    for path in files:
+        st = os.stat(path)
+        stamps[path] = [st.st_mtime, st.st_size]
+    return stamps
+
+def read_manifest(save_file, fingerprint, files=None):
+    """
+    指紋が一致し、出力ファイル（save_file と files）も書いたときのままなら create_schedule の戻り値を返す。
+    一致しなければ None。
+    """
+    files = files or [save_file]
+    try:
+        manifest = json.loads(read_file_bytes(_manifest_path(save_file)).decode("utf-8"))
+        stamps = _output_stamps(files)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("fingerprint") != fingerprint:
+        return None
+    if manifest.get("outputs") != stamps:
+        return None  # 出力が手で編集・削除された
+    return (save_file,) + tuple(int(v) for v in manifest["result"])
+
+def write_manifest(save_file, fingerprint, result, files=None):
+    manifest = {"fingerprint": fingerprint, "result": list(result[1:]), "outputs": _output_stamps(files or [save_file])}
+    write_file_atomic(_manifest_path(save_file), json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+@contextmanager
+def output_lock(save_file, token=None, poll=0.5):
+    """
+    出力ファイルごとのロック。他のPCが同じ日を作成中なら終わるまで待つ。
+    - LOCK_STALE_SECONDS より古いロックは取り除いて先に進む
+    """
+    lock_path = f"{save_file}.lock"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue  # 待っている間に消えた
+            if token is not None:
+                token.check()
+            time.sleep(poll)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write(f"{os.environ.get('COMPUTERNAME', '')} {os.getpid()} {datetime.now().isoformat()}\n")
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+@contextmanager
+def _stage(timer, token, name):
+    if token is not None:
+        token.stage(name)
+    with timer.phase(name):
+        yield
+
+def create_schedule(year, month, day, filter_type, import_path=DEFAULT_IMPORT, output_path=DEFAULT_OUTPUT, gui_select_file_func=None,
+                    request_file=REQUEST_FILE, template_file=SCHEDULE_TEMPLATE, snapshot_dir=SNAPSHOT_DIR,
+                    request_rows=None, template_data=None, schedule_files=None, timer=None, profile_path=None, token=None,
+                    force=False, formats=("xlsx",), report=None, history_db=HISTORY_DB):
     """
     - filter_type: "all" または "dollar"（新図面のみ）
     - import_path: フォルダパス（末尾は自動調整）
     - gui_select_file_func: 複数候補のときにGUI側で選ばせるコールバック
+    - request_file / template_file: 依頼現場名ファイルと出力テンプレート
+    - snapshot_dir: 依頼現場名の解析済みスナップショット置き場（None で無効）
+    - request_rows / template_data / schedule_files: 読み込み済みの入力
+      （load_request_rows の結果・テンプレートのバイト列・ScheduleIndex か list_schedule_files の結果）。
+      渡されたものはファイルから読み直さない
+    - timer: schedule_timing.PhaseTimer。工程ごとの所要時間を受け取りたいときに渡す
+      （渡さなくても計測結果はログファイルに残る）
+    - profile_path: 指定すると cProfile の結果をこのファイルに保存する
+    - token: ProgressToken。工程名と件数の通知を受け取り、cancel() で中止できる
+      （中止時は ScheduleCancelled を送出し、出力ファイルは書かない）
+    - force: True なら入力が前回と同じでも作り直す。False なら工程表・依頼現場名・テンプレート・
+      日付・フィルター・今日の日付が前回と同じとき、既存の出力とマニフェストの集計結果をそのまま返す
+    - formats: 出力する形式（EXPORT_FORMATS のキー）。同じ行を1回で各形式に書き出す。
+      戻り値の保存先は xlsx があれば xlsx、なければ先頭の形式のファイル。xlsx を含めなければテンプレートは読まない
+    - report: dict を渡すと、前回作成時（同じ日・同じ保存先・同じフィルター。工程表は修正版でもよい）からの差分を入れて返す
+      previous（前回の工程表 or None）, schedule_added / schedule_removed（工程表の増えた・消えた行数）,
+      reused_keys / joined_keys（前回の突き合わせを使った・新たに突き合わせた現場キー数）,
+      added / removed / changed（出力行。前回が無ければ入らない）, cached（マニフェストの結果をそのまま返した）
+      依頼現場名・フィルター・今日の日付が前回と同じなら、工程表に新しく出てきた現場キーだけを突き合わせる
+      （記録は snapshot_dir に置く。snapshot_dir=None か force=True なら全キーを突き合わせる）
+    - history_db: 出力行と集計を記録する履歴データベース（schedule_history。None で記録しない）
     """
+    formats = tuple(dict.fromkeys(formats))
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"出力形式が不正です: {', '.join(unknown) or '(なし)'}")
     import_path = os.path.normpath(import_path.rstrip("\\"))
     output_path = os.path.normpath(output_path.rstrip("\\"))
+    if timer is None:
+        timer = PhaseTimer()
 
-    target_date = datetime(year, month, day)
+    try:
+        with profiled(profile_path):
+            return _create_schedule(year, month, day, filter_type, import_path, output_path, gui_select_file_func,
+                                    request_file, template_file, snapshot_dir,
+                                    request_rows, template_data, schedule_files, timer, token, force, formats,
+                                    report, history_db)
+    finally:
+        timer.log(f"{year:04d}-{month:02d}-{day:02d} {filter_type}")
+
+def _create_schedule(year, month, day, filter_type, import_path, output_path, gui_select_file_func,
+                     request_file, template_file, snapshot_dir,
+                     request_rows, template_data, schedule_files, timer, token, force, formats, report, history_db):
 
     base_name1 = f"{month}-{day}"
-    base_name2 = f"{month:02d}-{day:02d}"
-    candidates = []
-
-    for f in os.listdir(import_path):
-        if f.endswith((".xls", ".xlsx")) and (base_name1 in f or base_name2 in f):
-            full_path = os.path.join(import_path, f)
-            full_path = os.path.normpath(full_path)
-            update_time = datetime.fromtimestamp(os.path.getmtime(full_path))
-            candidates.append((f, update_time, full_path))
+    with _stage(timer, token, "list"):
+        if schedule_files is None:
+            schedule_files = get_schedule_index(import_path)
+        candidates = find_schedule_candidates(schedule_files, month, day)
     if not candidates:
         raise FileNotFoundError(f"参照フォルダが存在しないかアクセスできません:{os.path.join(import_path, base_name1+'*.xls')}")
 
@@ -106,156 +972,196 @@ def create_schedule(year, month, day, filter_type, import_path=DEFAULT_IMPORT, o
     else:
         schedule_file = candidates[0][2]
 
-    wb_schedule, ws_schedule, tmp_schedule = read_excel_sheet(schedule_file, 'Sheet1')
+    paths = export_paths(output_path, year, month, day, formats)
+    save_file = paths.get("xlsx") or paths[formats[0]]
+    files = list(paths.values())
+    revision_file = None
+    if snapshot_dir:
+        # 全件と新図面のみは出力が違うので、記録もフィルターごとに分ける
+        revision_file = _revision_path(os.path.join(output_path, f"{year:04d}{month:02d}{day:02d}_{filter_type}"),
+                                       snapshot_dir)
+    if report is None:
+        report = {}
 
-    REQUEST_FILE = os.path.normpath(r"\\PC009\share01\依頼現場名 R1.xls")
-    wb_req, ws_req, tmp_request = read_excel_sheet(REQUEST_FILE, "Sheet3")
+    # 抽出期間は今日の日付で決まるので、今日の日付も指紋に含める
+    with _stage(timer, token, "manifest"):
+        inputs = (schedule_file, request_file) + ((template_file,) if "xlsx" in formats else ())
+        fingerprint = input_fingerprint(inputs, year, month, day, filter_type, formats,
+                                        datetime.today().date().isoformat())
+        if not force:
+            cached = read_manifest(save_file, fingerprint, files)
+            if cached is not None:
+                report.update(cached=True, previous=schedule_file, added=[], removed=[], changed=[])
+                return cached
 
-    SCHEDULE_TEMPLATE = os.path.normpath(r"\\PC009\share01\日程表\生産日程表★.xlsx")
-    wb_out = openpyxl.load_workbook(SCHEDULE_TEMPLATE)
-    ws_out = wb_out.active
+    with output_lock(save_file, token):
+        # ロック待ちの間に他のPCが同じ内容を作り終えていればそれを使う
+        if not force:
+            cached = read_manifest(save_file, fingerprint, files)
+            if cached is not None:
+                report.update(cached=True, previous=schedule_file, added=[], removed=[], changed=[])
+                return cached
+        result = _build_schedule(year, month, day, filter_type, schedule_file, save_file, paths, request_file,
+                                 template_file, snapshot_dir, request_rows, template_data, timer, token,
+                                 revision_file, force, report, history_db)
+        write_manifest(save_file, fingerprint, result, files)
+    return result
 
+def _build_schedule(year, month, day, filter_type, schedule_file, save_file, paths, request_file, template_file,
+                    snapshot_dir, request_rows, template_data, timer, token, revision_file, force, report, history_db):
+    target_date = datetime(year, month, day)
     today = datetime.today()
     start_date = today - relativedelta(months=5)
     end_date = today + relativedelta(months=2)
 
-    written_rows = set()
-    out_row = 2
+    with _stage(timer, token, "read_schedule"):
+        # 行数・ブロック数はシートごとに調べる（読み込みは1回、以降の工程は取り出した行だけを使う）
+        schedule_rows = read_excel_sheet(schedule_file, 'Sheet1', token=token)
+        schedule_blocks = extract_schedule_blocks(schedule_rows)
 
-    blocks = [(3, 62, "C"), (3, 62, "I")]
-    for start_row, end_row, col_c in blocks:
-        for r in range(start_row, end_row + 1):
-            key_val = ws_schedule[f"{col_c}{r}"].value
-            if key_val is None:
-                continue
-            key_val_str = normalize_key(key_val)
-            for req_r in range(2, ws_req.max_row + 1):
-                req_key = ws_req[f"C{req_r}"].value
-                if req_key is None:
-                    continue
-                req_key_str = normalize_key(req_key)
-                if key_val_str != req_key_str:
-                    continue
-                req_g = parse_excel_date(ws_req[f"G{req_r}"].value)
-                if req_g is None or req_g < start_date or req_g > end_date:
-                    continue
-                val_d = str(ws_req[f"D{req_r}"].value or "").strip()
-                val_c = str(ws_req[f"C{req_r}"].value or "").strip()
+    with _stage(timer, token, "revision"):
+        # 前回の記録と依頼現場名・フィルター・抽出期間が同じなら、その突き合わせ結果を使う
+        previous = load_revision(revision_file) if revision_file else None
+        request_stamp = input_fingerprint((request_file,), filter_type, today.date().isoformat())
+        keys = schedule_keys(schedule_blocks)
+        joined = {}
+        if previous is not None and not force and previous["request"] == request_stamp:
+            joined = {key: matches for key, matches in previous["joined"].items() if key in keys}
+        missing = keys - joined.keys()
+        report.update(cached=False, previous=previous["schedule_file"] if previous else None,
+                      reused_keys=len(joined), joined_keys=len(missing))
+        if previous is not None:
+            added, removed = diff_schedule_records(previous["blocks"], schedule_blocks)
+            report.update(schedule_added=len(added), schedule_removed=len(removed))
 
-                if filter_type == "dollar":
-                    if not (val_d.startswith("$") or val_d.startswith("＄")):
-                        continue
+    request_index = None
+    if missing:
+        with _stage(timer, token, "load_request"):
+            if request_rows is None:
+                request_rows = load_request_rows(request_file, snapshot_dir=snapshot_dir, token=token)
+            # 突き合わせが必要なキーの依頼行だけをまとめる
+            request_index = build_request_index(row for row in request_rows if row[0] in missing)
 
-                row_key = tuple(ws_req[f"{col}{req_r}"].value for col in "ABCDEF")
-                if row_key in written_rows:
-                    continue
-                written_rows.add(row_key)
-
-                val_a = str(ws_req[f"C{req_r}"].value or "").strip()
-                ws_out[f"A{out_row}"] = val_a
-                ws_out[f"A{out_row}"].number_format = '@'
-                ws_out[f"C{out_row}"] = ws_req[f"A{req_r}"].value
-                ws_out[f"F{out_row}"] = ws_req[f"B{req_r}"].value
-                ws_out[f"E{out_row}"] = ws_req[f"D{req_r}"].value
-                ws_out[f"D{out_row}"] = ws_req[f"E{req_r}"].value
-                ws_out[f"B{out_row}"] = target_date.strftime("%Y/%m/%d")
-                ws_out[f"I{out_row}"] = ws_req[f"F{req_r}"].value
-                out_row += 1
-
-    for r_out in range(2, out_row):
-        val_A = normalize_key(ws_out[f"A{r_out}"].value)
-        val_D = ws_out[f"D{r_out}"].value
-        val_F = ws_out[f"F{r_out}"].value
-
-        for r_schedule in range(3, 63):
-            c = normalize_key(ws_schedule[f"C{r_schedule}"].value)
-            d = ws_schedule[f"D{r_schedule}"].value
-            e = ws_schedule[f"E{r_schedule}"].value
-            f_val = ws_schedule[f"F{r_schedule}"].value
-            if c == val_A and d == val_F and e == val_D:
-                ws_out[f"I{r_out}"] = f_val
-                break
-
-        for r_schedule in range(3, 63):
-            i = normalize_key(ws_schedule[f"I{r_schedule}"].value)
-            j = ws_schedule[f"J{r_schedule}"].value
-            k = ws_schedule[f"K{r_schedule}"].value
-            l_val = ws_schedule[f"L{r_schedule}"].value
-            if i == val_A and j == val_F and k == val_D:
-                ws_out[f"I{r_out}"] = l_val
-                break
-
-    # --- 全件集計（メッセージ用） ---
-    gifu_new_total = shiga_new_total = gifu_old_total = shiga_old_total = 0
-    shiga_spec_total = 0  # ← 滋賀規格用集計
-
-    # D/F列ベース集計
-    for r in range(3, 63):
-        c = ws_schedule[f"C{r}"].value
-        d = ws_schedule[f"D{r}"].value
-        e = ws_schedule[f"E{r}"].value
-        f_val = safe_int(ws_schedule[f"F{r}"].value)
-
-        # 滋賀規格判定（C,E空、F値あり）
-        if (c is None or str(c).strip() == "") and (e is None or str(e).strip() == "") and f_val:
-            shiga_spec_total += f_val
-            continue  # 新旧計上には含めない
-
-        first = str(c or "").strip()[:1]
-        if re.match(r'[A-Za-z]', first):
-            if isinstance(d, str) and (d.startswith("$") or d.startswith("＄")):
-                gifu_new_total += f_val
-            else:
-                gifu_old_total += f_val
-        else:
-            if isinstance(d, str) and (d.startswith("$") or d.startswith("＄")):
-                shiga_new_total += f_val
-            else:
-                shiga_old_total += f_val
-
-    # J/L列ベース集計
-    for r in range(3, 63):
-        i = ws_schedule[f"I{r}"].value
-        j = ws_schedule[f"J{r}"].value
-        k = ws_schedule[f"K{r}"].value
-        l_val = safe_int(ws_schedule[f"L{r}"].value)
-
-        # 滋賀規格判定（I,K空、L値あり）
-        if (i is None or str(i).strip() == "") and (k is None or str(k).strip() == "") and l_val:
-            shiga_spec_total += l_val
-            continue  # 新旧計上には含めない
-
-        first = str(i or "").strip()[:1]
-        if re.match(r'[A-Za-z]', first):
-            if isinstance(j, str) and (j.startswith("$") or j.startswith("＄")):
-                gifu_new_total += l_val
-            else:
-                gifu_old_total += l_val
-        else:
-            if isinstance(j, str) and (j.startswith("$") or j.startswith("＄")):
-                shiga_new_total += l_val
-            else:
-                shiga_old_total += l_val
-
-    # --- 出力用集計（filter_typeに応じて） ---
-    gifu_new = gifu_new_total
-    shiga_new = shiga_new_total
-    gifu_old = gifu_old_total
-    shiga_old = shiga_old_total
-
-    # --- メッセージ用合計5項目 ---
-    total_sum = gifu_new + gifu_old + shiga_new + shiga_old + shiga_spec_total
-
-    save_file = os.path.join(output_path, f"{year:04d}{month:02d}{day:02d}_生産日程表★.xlsx")
-    save_file = os.path.normpath(save_file)
-    wb_out.save(save_file)
-
-    wb_out.close()
-    wb_schedule.close()
-    wb_req.close()
-    if tmp_schedule and os.path.exists(tmp_schedule):
-        os.remove(tmp_schedule)
-    if tmp_request and os.path.exists(tmp_request):
-        os.remove(tmp_request)
+    wb_out = None
+    if "xlsx" in paths:
+        with _stage(timer, token, "load_template"):
+            if template_data is None:
+                template_data = read_file_bytes(template_file)
+            wb_out = openpyxl.load_workbook(io.BytesIO(template_data))
+
+    with _stage(timer, token, "join"):
+        out_rows = join_schedule(schedule_blocks, request_index, filter_type, target_date, start_date, end_date, token,
+                                 joined)
+
+    with _stage(timer, token, "backfill"):
+        apply_backfill(out_rows, schedule_blocks)
+
+    with _stage(timer, token, "aggregate"):
+        summary = summarize_schedule(schedule_blocks)
+        gifu_new, shiga_new, gifu_old, shiga_old, shiga_spec_total, total_sum = summary
+
+    with _stage(timer, token, "save"):
+        # メモリ上で作り、共有へは形式ごとに1回で書き込む
+        outputs = render_exports(out_rows, summary, paths, target_date.strftime("%Y-%m-%d"), filter_type)
+        if wb_out is not None:
+            outputs["xlsx"] = render_output(wb_out, out_rows, token=token)
+        if token is not None:
+            token.check()  # ここが最後の中止確認。書き込みを始めたら最後まで終える
+        for fmt, data in outputs.items():
+            write_file_atomic(paths[fmt], data)
+
+    if previous is not None:
+        report.update(diff_output_rows(previous["out_rows"], out_rows))
+    if revision_file:
+        save_revision(revision_file, {"schedule_file": schedule_file, "request": request_stamp,
+                                      "blocks": schedule_blocks, "joined": joined, "out_rows": out_rows})
+    if history_db:
+        with timer.phase("history"):  # 出力は書き終えているので、ここでは中止させない
+            record_run(history_db, target_date.date(), filter_type, out_rows, summary, save_file, schedule_file)
 
     return save_file, int(gifu_new), int(shiga_new), int(gifu_old), int(shiga_old), int(shiga_spec_total), int(total_sum)
+
+# --- 期間まとめて作成 ---
+_batch_inputs = {}
+
+def _init_batch_worker(request_rows, template_data):
+    # ワーカープロセスごとに1回だけ共有入力を受け取る
+    _batch_inputs["request_rows"] = request_rows
+    _batch_inputs["template_data"] = template_data
+
+def _create_schedule_for_batch(year, month, day, filter_type, import_path, output_path, schedule_files,
+                               request_file, template_file, snapshot_dir, force, formats, history_db):
+    return create_schedule(
+        year, month, day, filter_type, import_path, output_path,
+        request_file=request_file,
+        template_file=template_file,
+        snapshot_dir=snapshot_dir,
+        request_rows=_batch_inputs["request_rows"],
+        template_data=_batch_inputs["template_data"],
+        schedule_files=schedule_files,
+        force=force,
+        formats=formats,
+        history_db=history_db,
+    )
+
+def create_schedules(start_date, end_date, filter_type, import_path=DEFAULT_IMPORT, output_path=DEFAULT_OUTPUT,
+                     request_file=REQUEST_FILE, template_file=SCHEDULE_TEMPLATE, snapshot_dir=SNAPSHOT_DIR, max_workers=None,
+                     force=False, formats=("xlsx",), history_db=HISTORY_DB):
+    """
+    start_date〜end_date（両端を含む）の日程表をまとめて作成する。
+    - 依頼現場名・テンプレート・工程表フォルダの一覧は最初に1回だけ読む
+    - 各日はプロセスプールで並列に作る（max_workers=1 ならこのプロセスで順番に作る）
+    - 戻り値: [(日付, create_schedule の戻り値 or None, エラーメッセージ or None), ...]
+      1日失敗しても他の日は続ける。工程表が無い日（休日など）は戻り値・エラーとも None
+    - force / formats / history_db: create_schedule と同じ
+    """
+    import_path = os.path.normpath(import_path.rstrip("\\"))
+    output_path = os.path.normpath(output_path.rstrip("\\"))
+
+    days = []
+    d = start_date
+    while d <= end_date:
+        days.append(d)
+        d += timedelta(days=1)
+    if not days:
+        return []
+
+    request_rows = load_request_rows(request_file, snapshot_dir=snapshot_dir)
+    template_data = read_file_bytes(template_file) if "xlsx" in formats else None
+    schedule_files = get_schedule_index(import_path)
+
+    jobs = []
+    skipped = set()
+    for d in days:
+        candidates = find_schedule_candidates(schedule_files, d.month, d.day)
+        if not candidates:
+            skipped.add(d)
+            continue
+        jobs.append((d, (d.year, d.month, d.day, filter_type, import_path, output_path, candidates,
+                         request_file, template_file, snapshot_dir, force, formats, history_db)))
+
+    results = [(d, None, None) for d in days if d in skipped]
+    if not jobs:
+        return results
+    if max_workers == 1:
+        _init_batch_worker(request_rows, template_data)
+        for d, args in jobs:
+            try:
+                results.append((d, _create_schedule_for_batch(*args), None))
+            except Exception as e:
+                results.append((d, None, str(e)))
+        results.sort(key=lambda r: r[0])
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker,
+                             initargs=(request_rows, template_data)) as pool:
+        futures = [(d, pool.submit(_create_schedule_for_batch, *args)) for d, args in jobs]
+        for d, fut in futures:
+            try:
+                results.append((d, fut.result(), None))
+            except Exception as e:
+                results.append((d, None, str(e)))
+    results.sort(key=lambda r: r[0])
+    return results
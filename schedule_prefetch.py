@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+共有フォルダ上の入力（依頼現場名・テンプレート・工程表フォルダの索引）を
+バックグラウンドで先読みし、更新日時が変わったら読み直して保持する。
+"""
+import os
+import threading
+
+from schedule_logic import (
+    DEFAULT_IMPORT, REQUEST_FILE, SCHEDULE_TEMPLATE, SNAPSHOT_DIR,
+    load_request_rows, read_file_bytes,
+)
+from schedule_index import get_schedule_index
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime, st.st_size
+
+class SchedulePrefetcher:
+    """
+    - start() でバックグラウンドの先読みを始め、interval 秒ごとに更新を確認する
+    - inputs() は create_schedule にそのまま渡せる読み込み済み入力の dict を返す
+      （request_rows / template_data / schedule_files のうち読めたものだけ。schedule_files は ScheduleIndex）
+    """
+    def __init__(self, import_path=DEFAULT_IMPORT, request_file=REQUEST_FILE, template_file=SCHEDULE_TEMPLATE,
+                 snapshot_dir=SNAPSHOT_DIR, interval=30):
+        self.import_path = os.path.normpath(import_path.rstrip("\\"))
+        self.request_file = request_file
+        self.template_file = template_file
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.errors = {}  # 入力名 → 直近の読み込みエラー
+
+        self._data = {}    # 入力名 → 読み込み済みの値
+        self._stamps = {}  # 入力名 → 読み込んだときの (更新日時, サイズ)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="schedule-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def _refresh_one(self, name, path, loader):
+        try:
+            stamp = _stamp(path)
+            if self._stamps.get(name) != stamp:
+                self._data[name] = loader()
+                self._stamps[name] = stamp
+            self.errors.pop(name, None)
+        except Exception as e:
+            # 共有に届かないときは前回の値を残す
+            self.errors[name] = str(e)
+
+    def _refresh_index(self):
+        index = get_schedule_index(self.import_path)
+        index.refresh()
+        return index
+
+    def refresh(self):
+        """更新日時・サイズが変わった入力だけ読み直す。"""
+        with self._lock:
+            self._refresh_one("request_rows", self.request_file,
+                              lambda: load_request_rows(self.request_file, snapshot_dir=self.snapshot_dir))
+            self._refresh_one("template_data", self.template_file, lambda: read_file_bytes(self.template_file))
+            # フォルダの更新日時はファイルの追加・削除・名前変更で変わる
+            self._refresh_one("schedule_files", self.import_path, self._refresh_index)
+
+    def inputs(self, refresh=True):
+        """
+        create_schedule 用の読み込み済み入力を返す。
+        - refresh=True なら先に更新日時だけ確認し、変わっていれば読み直す（確認は stat 3回）
+        """
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return dict(self._data)
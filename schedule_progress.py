@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+create_schedule の進捗通知と中止要求（GUI から openpyxl などを読み込まずに使えるよう分けてある）。
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+class ScheduleCancelled(Exception):
+    """ProgressToken.cancel() で処理が中止されたときに送出される。"""
+
+class ProgressToken:
+    """
+    create_schedule の進捗通知と中止要求をやり取りする。
+    - on_progress(工程名, 済み件数, 全件数) を呼ぶ（全件数 0 は件数不明）。件数だけの更新は interval 秒ごとに間引く
+    - cancel() は別スレッドから呼んでよい。処理側は次の確認ポイントで ScheduleCancelled を送出する
+    """
+    def __init__(self, on_progress=None, interval=0.1):
+        self.on_progress = on_progress
+        self.interval = interval
+        self.stage_name = None
+        self._cancelled = threading.Event()
+        self._cancel_callbacks = []
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            callbacks = list(self._cancel_callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise ScheduleCancelled("処理が中止されました")
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """この with の間に中止されたら callback を呼ぶ（止められない外部処理の後始末用）。"""
+        with self._lock:
+            self._cancel_callbacks.append(callback)
+        try:
+            if self.cancelled:
+                callback()
+            yield
+        finally:
+            with self._lock:
+                self._cancel_callbacks.remove(callback)
+
+    def stage(self, name, total=0):
+        self.check()
+        self.stage_name = name
+        self._last_report = time.monotonic()
+        if self.on_progress is not None:
+            self.on_progress(name, 0, total)
+
+    def advance(self, done, total=0):
+        self.check()
+        now = time.monotonic()
+        if self.on_progress is not None and now - self._last_report >= self.interval:
+            self._last_report = now
+            self.on_progress(self.stage_name, done, total)
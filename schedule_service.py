@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+常駐サービス: 共有ファイルを先読みしたまま、日程表作成をジョブとして受け付ける（localhost の HTTP）。
+
+    python schedule_service.py                 # http://127.0.0.1:8765/ で待ち受け
+
+API（JSON）
+    GET    /health             稼働確認と先読みの状態
+    POST   /jobs               {"year", "month", "day", "filter_type", "schedule_file"?, "force"?, "formats"?} → {"id"}
+    GET    /jobs/<id>?wait=秒  ジョブの状態（wait 秒まで完了を待つ）
+    DELETE /jobs/<id>          ジョブの中止
+"""
+import os
+import sys
+import json
+import uuid
+import time
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from schedule_cli import RESULT_KEYS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_JOBS_KEPT = 200
+FINAL_STATUSES = ("finished", "error", "cancelled")
+
+logger = logging.getLogger("schedule.service")
+
+# --- サービス側 ---
+class ScheduleService:
+    """
+    - 先読み（SchedulePrefetcher）した入力で create_schedule を実行する
+    - 同時に実行するジョブは max_workers 件まで。それ以上は順番待ち
+    """
+    def __init__(self, import_path=None, output_path=None, max_workers=2):
+        import schedule_logic
+        from schedule_prefetch import SchedulePrefetcher
+        self.logic = schedule_logic
+        self.import_path = import_path or schedule_logic.DEFAULT_IMPORT
+        self.output_path = output_path or schedule_logic.DEFAULT_OUTPUT
+        self.prefetcher = SchedulePrefetcher(self.import_path)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="schedule-job")
+        self.jobs = OrderedDict()  # id → ジョブの状態 dict
+        self._tokens = {}
+        self._done = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.prefetcher.start()
+
+    def submit(self, params):
+        year, month, day = int(params["year"]), int(params["month"]), int(params["day"])
+        filter_type = params.get("filter_type", "all")
+        if filter_type not in ("all", "dollar"):
+            raise ValueError(f"filter_type が不正です: {filter_type}")
+        formats = tuple(params.get("formats") or ("xlsx",))
+        unknown = [fmt for fmt in formats if fmt not in self.logic.EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"formats が不正です: {', '.join(map(str, unknown))}")
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "date": f"{year:04d}-{month:02d}-{day:02d}",
+               "filter_type": filter_type, "stage": None, "done": 0, "total": 0,
+               "result": None, "changes": None, "error": None, "timings": None, "created": time.time()}
+
+        def on_progress(stage, done, total):
+            job.update(stage=stage, done=done, total=total)
+
+        token = self.logic.ProgressToken(on_progress=on_progress)
+        with self._lock:
+            self.jobs[job_id] = job
+            self._tokens[job_id] = token
+            self._done[job_id] = threading.Event()
+            # 古い順に、終わったジョブだけを捨てる（待ち・実行中のジョブは残す）
+            excess = len(self.jobs) - MAX_JOBS_KEPT
+            if excess > 0:
+                old_ids = [old_id for old_id, old in self.jobs.items() if old["status"] in FINAL_STATUSES][:excess]
+                for old_id in old_ids:
+                    del self.jobs[old_id]
+                    self._tokens.pop(old_id, None)
+                    self._done.pop(old_id, None)
+        self.executor.submit(self._run, job, token, year, month, day, filter_type,
+                             params.get("schedule_file"), bool(params.get("force")), formats)
+        return job_id
+
+    def _run(self, job, token, year, month, day, filter_type, schedule_file, force, formats):
+        from schedule_timing import PhaseTimer
+        timer = PhaseTimer()
+        job["status"] = "running"
+        report = {}
+        final = {}
+        try:
+            inputs = self.prefetcher.inputs()
+            if schedule_file:
+                # GUI で選んだ工程表だけを候補にする
+                files = self.logic.get_schedule_index(self.import_path).files()
+                inputs["schedule_files"] = [c for c in files if c[0] == os.path.basename(schedule_file)]
+            result = self.logic.create_schedule(year, month, day, filter_type, self.import_path, self.output_path,
+                                                timer=timer, token=token, force=force, formats=formats,
+                                                report=report, **inputs)
+            final = dict(status="finished", result=dict(zip(RESULT_KEYS, result)), changes=report)
+        except self.logic.ScheduleCancelled:
+            final = dict(status="cancelled")
+        except Exception as e:
+            logger.warning("ジョブ %s が失敗しました: %s", job["id"], e)
+            final = dict(status="error", error=str(e))
+        finally:
+            # 終了状態と所要時間は1回の update で入れる（finished なのに timings が無い瞬間を作らない）
+            job.update(final, timings=timer.summary())
+            done = self._done.get(job["id"])
+            if done is not None:
+                done.set()
+
+    def get(self, job_id, wait=0):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            done = self._done.get(job_id)
+        if job is None:
+            return None
+        if wait and done is not None:
+            done.wait(wait)
+        return dict(job)
+
+    def cancel(self, job_id):
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def health(self):
+        return {"ok": True, "import_path": self.import_path, "output_path": self.output_path,
+                "prefetch_errors": dict(self.prefetcher.errors)}
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None  # make_server で設定する
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            return parts[1]
+        return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send(200, self.service.health())
+        job_id = self._job_id(url.path)
+        if job_id is None:
+            return self._send(404, {"error": "not found"})
+        wait = float(parse_qs(url.query).get("wait", ["0"])[0])
+        job = self.service.get(job_id, wait=min(wait, 60))
+        if job is None:
+            return self._send(404, {"error": "ジョブがありません"})
+        self._send(200, job)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length) or b"{}")
+            job_id = self.service.submit(params)
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": str(e)})
+        self._send(202, {"id": job_id})
+
+    def do_DELETE(self):
+        job_id = self._job_id(urlparse(self.path).path)
+        if job_id is None or not self.service.cancel(job_id):
+            return self._send(404, {"error": "ジョブがありません"})
+        self._send(200, {"id": job_id, "cancel_requested": True})
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    handler = type("ScheduleHandler", (_Handler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+# --- クライアント側（GUI などから使う。PyQt にも schedule_logic にも依存しない） ---
+class ScheduleServiceClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=5):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, timeout=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=timeout or self.timeout) as res:
+            return json.loads(res.read().decode("utf-8"))
+
+    def available(self):
+        """サービスが起動していれば True（起動していなければすぐ False が返る）。"""
+        try:
+            return bool(self._request("GET", "/health", timeout=1).get("ok"))
+        except (OSError, ValueError):
+            return False
+
+    def submit(self, year, month, day, filter_type, schedule_file=None, force=False, formats=None):
+        body = {"year": year, "month": month, "day": day, "filter_type": filter_type, "force": force}
+        if formats:
+            body["formats"] = list(formats)
+        if schedule_file:
+            body["schedule_file"] = schedule_file
+        return self._request("POST", "/jobs", body)["id"]
+
+    def status(self, job_id, wait=0):
+        return self._request("GET", f"/jobs/{job_id}?wait={wait}", timeout=self.timeout + wait)
+
+    def cancel(self, job_id):
+        try:
+            self._request("DELETE", f"/jobs/{job_id}")
+        except urllib.error.HTTPError:
+            pass  # もう終わっている
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日程表作成の常駐サービス")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="同時に実行するジョブ数")
+    parser.add_argument("--import-path", help="工程表フォルダ")
+    parser.add_argument("--output-path", help="保存先フォルダ")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    service = ScheduleService(args.import_path, args.output_path, max_workers=args.workers)
+    service.start()
+    server = make_server(service, args.host, args.port)
+    logger.info("待ち受け開始: http://%s:%d/", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+create_schedule の工程ごとの計測（所要時間・ピークメモリ・cProfile）。
+"""
+import os
+import time
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+LOG_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "schedule")
+TIMING_LOG = os.path.join(LOG_DIR, "schedule_timing.log")
+
+_logger = None
+
+def get_timing_logger():
+    """計測結果用のロガー（LOG_DIR に 1MB x 3 世代でローテーション）。"""
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger("schedule.timing")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handler = RotatingFileHandler(TIMING_LOG, maxBytes=1024 * 1024, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            _logger.addHandler(handler)
+        except OSError:
+            # ログが書けなくても処理は止めない
+            _logger.addHandler(logging.NullHandler())
+    return _logger
+
+class PhaseTimer:
+    """
+    工程ごとの所要時間を記録する。
+    - phases: [(工程名, 秒, ピークメモリ(バイト) or None), ...]
+    - on_phase: 工程が終わるたびに on_phase(工程名, 秒, ピークメモリ) を呼ぶ
+    - trace_memory: True なら tracemalloc で工程ごとのピークメモリも測る（遅くなる）
+    """
+    def __init__(self, on_phase=None, trace_memory=False):
+        self.phases = []
+        self.on_phase = on_phase
+        self.trace_memory = trace_memory
+
+    @contextmanager
+    def phase(self, name):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append((name, seconds, peak))
+            if self.on_phase is not None:
+                self.on_phase(name, seconds, peak)
+
+    def total(self):
+        return sum(seconds for _, seconds, _ in self.phases)
+
+    def summary(self):
+        """'list=0.012s join=0.105s ...' の形の1行。"""
+        parts = []
+        for name, seconds, peak in self.phases:
+            text = f"{name}={seconds:.3f}s"
+            if peak is not None:
+                text += f"/{peak / (1024 * 1024):.1f}MB"
+            parts.append(text)
+        parts.append(f"total={self.total():.3f}s")
+        return " ".join(parts)
+
+    def log(self, label):
+        get_timing_logger().info("%s %s", label, self.summary())
+
+@contextmanager
+def profiled(profile_path):
+    """profile_path が指定されていれば、その間の処理を cProfile で測って保存する。"""
+    if not profile_path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+工程表フォルダを監視し、M-D*.xls が置かれたり更新されたりしたらその日の日程表を自動で作る。
+
+    python schedule_watch.py                   # 5秒ごとに確認し続ける
+    python schedule_watch.py --since-hours 12  # 起動前12時間以内に置かれたファイルも作成対象にする
+
+- フォルダの更新日時を見て、変わったときだけ一覧を取り直す（一定回数ごとに念のため取り直す）
+- 書き込み途中のファイルは、更新日時・サイズが settle 秒変わらなくなるまで待つ
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime
+
+import schedule_logic
+from schedule_prefetch import SchedulePrefetcher
+from schedule_index import date_from_name, is_schedule_file
+
+logger = logging.getLogger("schedule.watch")
+
+class ScheduleWatcher:
+    """
+    - poll() を繰り返し呼ぶと、新しく置かれた／更新された工程表の日程表を作る
+    - 起動時にすでにあるファイルは作り直さない。since_hours を指定すると、
+      起動前その時間以内に更新されたファイルは最初の poll で作成対象にする
+    """
+    def __init__(self, import_path=schedule_logic.DEFAULT_IMPORT, output_path=schedule_logic.DEFAULT_OUTPUT,
+                 filter_type="all", settle=10, full_scan_every=6, since_hours=0, prefetcher=None):
+        self.import_path = os.path.normpath(import_path.rstrip("\\"))
+        self.output_path = output_path
+        self.filter_type = filter_type
+        self.settle = settle
+        self.full_scan_every = full_scan_every
+        self.prefetcher = prefetcher
+
+        # ファイル名 → (更新日時, サイズ)。ここに無い・値が違うファイルが作成対象
+        cutoff = time.time() - since_hours * 3600
+        self._known = {name: stamp for name, stamp in self._scan().items() if stamp[0] < cutoff}
+        self._pending = {}  # ファイル名 → ((更新日時, サイズ), 最初にその状態を見た時刻)
+        self._dir_mtime = None
+        self._polls = 0
+
+    def _scan(self):
+        files = {}
+        with os.scandir(self.import_path) as it:
+            for entry in it:
+                name = entry.name
+                if not is_schedule_file(name):
+                    continue  # Excel の一時ファイルは無視
+                st = entry.stat()
+                files[name] = (st.st_mtime, st.st_size)
+        return files
+
+    def _needs_scan(self):
+        self._polls += 1
+        dir_mtime = os.stat(self.import_path).st_mtime
+        changed = dir_mtime != self._dir_mtime
+        self._dir_mtime = dir_mtime
+        # 上書き保存ではフォルダの更新日時が変わらないことがあるので、定期的に取り直す
+        return changed or self._pending or self._polls % self.full_scan_every == 0
+
+    def poll(self, now=None):
+        """1回分の確認。作成した日程表の [(ファイル名, create_schedule の戻り値 or 例外), ...] を返す。"""
+        now = time.monotonic() if now is None else now
+        if not self._needs_scan():
+            return []
+        current = self._scan()
+
+        for name, stamp in current.items():
+            if self._known.get(name) == stamp:
+                self._pending.pop(name, None)
+                continue
+            pending = self._pending.get(name)
+            if pending is None or pending[0] != stamp:
+                self._pending[name] = (stamp, now)  # 新規・変化あり → 落ち着くまで待つ
+        for name in list(self._pending):
+            if name not in current:
+                del self._pending[name]
+        for name in list(self._known):
+            if name not in current:
+                del self._known[name]
+
+        results = []
+        for name, (stamp, since) in list(self._pending.items()):
+            if now - since < self.settle:
+                continue
+            del self._pending[name]
+            self._known[name] = stamp
+            results.append((name, self._generate(name, stamp)))
+        return results
+
+    def _generate(self, name, stamp):
+        target = date_from_name(name)
+        if target is None:
+            logger.info("日付が読めないファイルは無視します: %s", name)
+            return None
+        full_path = os.path.normpath(os.path.join(self.import_path, name))
+        inputs = self.prefetcher.inputs() if self.prefetcher is not None else {}
+        # 置かれたファイルそのものを使う（同じ日の他の候補は見ない）
+        inputs["schedule_files"] = [(name, datetime.fromtimestamp(stamp[0]), full_path)]
+        try:
+            result = schedule_logic.create_schedule(
+                target.year, target.month, target.day, self.filter_type,
+                self.import_path, self.output_path, **inputs)
+            logger.info("%s → %s (合計 %d 台)", name, result[0], result[6])
+            return result
+        except Exception as e:
+            logger.exception("%s の日程表を作成できませんでした", name)
+            return e
+
+    def run_forever(self, interval=5):
+        while True:
+            try:
+                self.poll()
+            except OSError as e:
+                logger.warning("工程表フォルダを確認できません: %s", e)
+            time.sleep(interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="工程表フォルダを監視して日程表を自動作成する")
+    parser.add_argument("--import-path", default=schedule_logic.DEFAULT_IMPORT, help="工程表フォルダ")
+    parser.add_argument("--output-path", default=schedule_logic.DEFAULT_OUTPUT, help="保存先フォルダ")
+    parser.add_argument("--filter", dest="filter_type", choices=("all", "dollar"), default="all")
+    parser.add_argument("--interval", type=float, default=5, help="確認の間隔（秒）")
+    parser.add_argument("--settle", type=float, default=10, help="書き込み完了とみなすまでの待ち時間（秒）")
+    parser.add_argument("--since-hours", type=float, default=0,
+                        help="起動前この時間以内に更新されたファイルも作成対象にする")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    prefetcher = SchedulePrefetcher(args.import_path, interval=300)
+    watcher = ScheduleWatcher(args.import_path, args.output_path, args.filter_type,
+                              settle=args.settle, since_hours=args.since_hours, prefetcher=prefetcher)
+    prefetcher.start()
+    watcher.run_forever(args.interval)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+test_read_backends.py 用の sample.xls / sample.xlsx を作り直す（xlwt が必要。テスト自体には不要）。
+
+    python test_data/read_backends/make_fixtures.py
+
+どちらにも同じセルを書く。xlsx は Excel が保存したときと同じく、整数値の数値は int で書く。
+"""
+import os
+from datetime import datetime
+
+import openpyxl
+import xlwt
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ERROR = object()  # 後ろに続く文字列をエラー値として書く
+# BIFF のエラーコード（xlwt の対応表は #VALUE! / #N/A が誤っているので使わない）
+ERROR_CODES = {"#NULL!": 0x00, "#DIV/0!": 0x07, "#VALUE!": 0x0F, "#REF!": 0x17, "#NAME?": 0x1D, "#NUM!": 0x24,
+               "#N/A": 0x2A}
+
+# シート名 → 行（None は空セル、(ERROR, "#N/A") はエラー値、(値, 表示形式) は書式付き）
+SHEETS = {
+    "Sheet1": [
+        ["現場", "日付", "No", "品名", "図面", "区分", "G", "H", "台数"],
+        [5, 2.5, 3, -12, 1234567890123, 0, 0.1],
+        [(datetime(2025, 10, 25), "yyyy/mm/dd"), (datetime(2025, 10, 25, 13, 45, 30), "yyyy/mm/dd hh:mm:ss"),
+         "2025/10/25", (datetime(1900, 3, 1), "yyyy/mm/dd")],
+        [None, "x", None, "", None, "末尾の前"],
+        [True, False, (ERROR, "#DIV/0!"), (ERROR, "#N/A"), (ERROR, "#VALUE!")],
+        ["A12-3"],
+        [],
+        [" K61－7 ", "＄D20", "$D9", "N24", 7.0],
+    ],
+    "Sheet3": [
+        ["hA", "hB", "hC", "hD", "hE", "hF", "hG"],
+        [1821, "D9", "534-1", "＄D20", "N24", 7, (datetime(2025, 9, 1), "yyyy/mm/dd")],
+        [4365, 8, "K61-7", "$D34", "N21", 1, "2025/09/02"],
+        [3265, None, "K61ー7", "D24", "N27", 11, "bad"],
+        [1077, 1, "154-2"],
+    ],
+}
+
+def _split(value):
+    if isinstance(value, tuple):
+        return value
+    return value, None
+
+def write_xls(path):
+    book = xlwt.Workbook()
+    styles = {}
+    for name, rows in SHEETS.items():
+        sh = book.add_sheet(name)
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                value, fmt = _split(cell)
+                if value is None:
+                    continue
+                if value is ERROR:
+                    sh.row(r).set_cell_error(c, ERROR_CODES[fmt])
+                elif fmt:
+                    style = styles.setdefault(fmt, xlwt.easyxf(num_format_str=fmt))
+                    sh.write(r, c, value, style)
+                else:
+                    sh.write(r, c, value)
+    book.save(path)
+
+def write_xlsx(path):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, rows in SHEETS.items():
+        ws = wb.create_sheet(name)
+        for r, row in enumerate(rows, start=1):
+            for c, cell in enumerate(row, start=1):
+                value, fmt = _split(cell)
+                if value is None:
+                    continue
+                if value is ERROR:
+                    ws.cell(r, c).value = fmt
+                    ws.cell(r, c).data_type = "e"
+                    continue
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)  # Excel は 7.0 を "7" と保存する
+                ws.cell(r, c).value = value
+                if fmt:
+                    ws.cell(r, c).number_format = fmt
+    wb.save(path)
+
+if __name__ == "__main__":
+    write_xls(os.path.join(HERE, "sample.xls"))
+    write_xlsx(os.path.join(HERE, "sample.xlsx"))
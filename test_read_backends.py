@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+read_excel_sheet の xlrd（.xls）と openpyxl（.xlsx）が同じ値を返すことの確認。
+
+    python -m pytest -q test_read_backends.py
+
+test_data/read_backends の sample.xls / sample.xlsx は同じセルを持つ（make_fixtures.py で作成）。
+"""
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("xlrd")
+
+import schedule_logic
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "read_backends")
+XLS = os.path.join(FIXTURES, "sample.xls")
+XLSX = os.path.join(FIXTURES, "sample.xlsx")
+
+def _typed(rows):
+    # 3 == 3.0 == True なので、型も含めて比べる
+    return [[(type(v).__name__, v) for v in row] for row in rows]
+
+def _read_both(sheet_name, **kwargs):
+    xls_rows = schedule_logic.read_excel_sheet(XLS, sheet_name, backend="xlrd", **kwargs)
+    xlsx_rows = schedule_logic.read_excel_sheet(XLSX, sheet_name, backend="openpyxl", **kwargs)
+    return xls_rows, xlsx_rows
+
+@pytest.mark.parametrize("sheet_name", ["Sheet1", "Sheet3"])
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"max_col": 7},
+    {"max_col": 12},
+    {"min_row": 2, "max_row": 5},
+    {"min_row": 3, "max_row": 4, "max_col": 3},
+], ids=["all", "max_col7", "max_col12", "rows2-5", "rows3-4_col3"])
+def test_backends_identical(sheet_name, kwargs):
+    xls_rows, xlsx_rows = _read_both(sheet_name, **kwargs)
+    assert _typed(xls_rows) == _typed(xlsx_rows)
+
+def test_default_dispatch_uses_xlrd_for_xls():
+    assert _typed(schedule_logic.read_excel_sheet(XLS, "Sheet1")) == \
+        _typed(schedule_logic.read_excel_sheet(XLSX, "Sheet1"))
+
+def test_numbers_keep_int_and_float():
+    rows, _ = _read_both("Sheet1", max_col=9)
+    assert _typed([rows[1][:7]]) == [[("int", 5), ("float", 2.5), ("int", 3), ("int", -12),
+                                      ("int", 1234567890123), ("int", 0), ("float", 0.1)]]
+    # 7.0 は Excel では整数として保存される
+    assert _typed([rows[7][4:5]]) == [[("int", 7)]]
+
+def test_dates():
+    rows, _ = _read_both("Sheet1", max_col=9)
+    assert rows[2][:4] == (datetime(2025, 10, 25), datetime(2025, 10, 25, 13, 45, 30), "2025/10/25",
+                           datetime(1900, 3, 1))
+
+def test_blanks_and_errors():
+    rows, _ = _read_both("Sheet1", max_col=9)
+    assert rows[3][0] is None and rows[3][2] is None and rows[3][1] == "x"
+    assert rows[4][:5] == (True, False, "#DIV/0!", "#N/A", "#VALUE!")
+    assert type(rows[4][0]) is bool
+
+@pytest.mark.parametrize("max_col", [1, 7, 12])
+def test_max_col_padding(max_col):
+    xls_rows, xlsx_rows = _read_both("Sheet1", max_col=max_col)
+    for rows in (xls_rows, xlsx_rows):
+        assert all(len(row) == max_col for row in rows)
+    # 1列しかない行・空行も None で埋まる
+    assert xls_rows[5] == ("A12-3",) + (None,) * (max_col - 1)
+    assert xls_rows[6] == (None,) * max_col
+
+def test_min_row_keeps_row_numbers():
+    xls_rows, xlsx_rows = _read_both("Sheet3", min_row=3, max_col=7)
+    assert xls_rows[:2] == xlsx_rows[:2] == [(), ()]
+    assert schedule_logic.sheet_value(xls_rows, "C", 3) == schedule_logic.sheet_value(xlsx_rows, "C", 3) == "K61-7"
+
+def test_request_rows_identical():
+    xls_rows, xlsx_rows = _read_both("Sheet3", max_col=7)
+    assert schedule_logic.parse_request_rows(xls_rows) == schedule_logic.parse_request_rows(xlsx_rows)